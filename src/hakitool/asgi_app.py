@@ -0,0 +1,217 @@
+"""
+Optional ASGI entry point (alternative to `flask_app.uwsgi_entry`).
+
+The (synchronous) flask app is executed in a bounded thread pool. Requests which do not
+fit into the pool and the waiting queue are rejected immediately (503), requests which take
+too long are aborted (504) and requests of disconnected clients are cancelled. Thus many
+concurrent searches can not exhaust the small number of workers on a shared host.
+
+Usage (requires `uvicorn`):
+
+    hakitool run --asgi
+    # or
+    uvicorn hakitool.asgi_app:asgi_entry --port 8000
+"""
+
+import io
+import sys
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+MAX_WORKERS = 4
+MAX_QUEUE = 16
+REQUEST_TIMEOUT = 30.0
+
+# key under which the wsgi environ provides a threading.Event to abort long running work
+CANCEL_EVENT_KEY = "hakitool.cancel_event"
+
+
+class AsyncSearchService:
+    def __init__(
+        self,
+        wsgi_app,
+        max_workers: int = MAX_WORKERS,
+        max_queue: int = MAX_QUEUE,
+        timeout: float = REQUEST_TIMEOUT,
+    ) -> None:
+        """Wrap a wsgi app such that it can be served by an ASGI server.
+
+        Args:
+            wsgi_app: the (flask) wsgi application
+            max_workers: number of threads which execute requests in parallel
+            max_queue: number of requests which may wait for a free thread
+            timeout: seconds after which a request is aborted
+        """
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hakitool")
+
+        # number of requests which are currently running or waiting (also changed by worker threads)
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._handle_http(scope, receive, send)
+        else:
+            raise NotImplementedError(f"unsupported scope type: {scope['type']}")
+
+    async def _handle_lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _handle_http(self, scope, receive, send) -> None:
+        # reserve the slot before the first await, otherwise concurrent requests could all pass the check;
+        # once the request is submitted, the slot is released when the worker thread is done with it
+        with self.pending_lock:
+            admitted = self.pending < self.max_workers + self.max_queue
+            if admitted:
+                self.pending += 1
+        if not admitted:
+            await self._send_response(send, "503 Service Unavailable", [], [b"server busy, try again later"])
+            return
+
+        submitted = False
+        try:
+            body = []
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.append(message.get("body", b""))
+                more_body = message.get("more_body", False)
+
+            cancel_event = threading.Event()
+            environ = build_environ(scope, b"".join(body))
+            environ[CANCEL_EVENT_KEY] = cancel_event
+
+            executor_future = self.executor.submit(self._run_wsgi_app, environ)
+            executor_future.add_done_callback(self._release)
+            submitted = True
+        finally:
+            if not submitted:
+                self._release()
+
+        future = asyncio.wrap_future(executor_future)
+        disconnect_task = asyncio.ensure_future(_wait_for_disconnect(receive))
+        done, _ = await asyncio.wait(
+            {future, disconnect_task}, timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        disconnect_task.cancel()
+
+        if future not in done:
+            # timeout or client disconnect: queued requests are not started at all,
+            # running requests are asked to stop via the event
+            cancel_event.set()
+            executor_future.cancel()
+            if disconnect_task not in done:
+                await self._send_response(send, "504 Gateway Timeout", [], [b"request timed out"])
+            return
+
+        status, headers, chunks = future.result()
+        await self._send_response(send, status, headers, chunks)
+
+    def _release(self, future=None) -> None:
+        with self.pending_lock:
+            self.pending -= 1
+
+    def _run_wsgi_app(self, environ: dict) -> tuple[str, list, list[bytes]]:
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            chunks = list(iterable)
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+        return response["status"], response["headers"], chunks
+
+    @staticmethod
+    async def _send_response(send, status: str, headers: list, chunks: list[bytes]) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def build_environ(scope: dict, body: bytes) -> dict:
+    """Create a wsgi environ dict from an ASGI http scope (see PEP 3333)."""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        if name in environ:
+            value = f"{environ[name]},{value}"
+        environ[name] = value
+    return environ
+
+
+_service = None
+
+
+async def asgi_entry(scope, receive, send) -> None:
+    """ASGI application (the flask app is created on first use)."""
+    global _service
+    if _service is None:
+        from . import flask_app
+
+        flask_app.init()
+        _service = AsyncSearchService(flask_app.create_app())
+        flask_app.c.logger.info("start flask app via asgi")
+    await _service(scope, receive, send)
+
+
+def main(host: str = "0.0.0.0", port: int = 8000) -> None:
+    try:
+        import uvicorn
+    except ImportError:
+        print("You need to install the package `uvicorn` to run the asgi app")
+        return
+    uvicorn.run(asgi_entry, host=host, port=port)
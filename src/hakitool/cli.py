@@ -1,8 +1,12 @@
 import os
+import sys
+import json
 import argparse
+import contextlib
 
-from . import flask_app, release
-from . import deploy
+# note: subcommand modules (flask_app, deploy, download, ...) are imported only when needed
+# because some of their dependencies are slow to import (see test_cli_startup.py)
+from . import release
 
 
 def main():
@@ -12,12 +16,86 @@ def main():
 
     subparsers = parser.add_subparsers(dest="command")
     run_parser = subparsers.add_parser("run", help="run the application")
+    run_parser.add_argument("--asgi", help="serve the app via uvicorn with a bounded worker pool", action="store_true")
     download_parser = subparsers.add_parser("download", help="download transcripts from yt")
-    if deploy.REQUIREMENTS_INSTALLED:
-        deploy_parser = subparsers.add_parser("deploy", help="deploy the application", add_help=False)
-        deploy.DeploymentManager.add_deployment_args(deploy_parser)
 
-    args = parser.parse_args()
+    index_parser = subparsers.add_parser("index", help="build the search index")
+    add_index_args(index_parser)
+    index_parser.add_argument(
+        "--memory-budget", help="approximate memory (MB) for buffered postings (and --dedup signatures)", type=float, default=256
+    )
+    index_parser.add_argument(
+        "--dedup",
+        help="index only one copy of near-duplicate transcripts (optional: minimum similarity, default 0.8)",
+        type=float,
+        nargs="?",
+        const=0.8,
+        metavar="THRESHOLD",
+    )
+    index_parser.add_argument("--shards", help="build a sharded index with this number of shards", type=int)
+    index_parser.add_argument(
+        "--shard-strategy", help="assign files to shards by (default: date)", choices=["date", "hash"]
+    )
+    index_parser.add_argument("--shard-dir", help="directory of the sharded index", default="index_shards")
+    index_parser.add_argument("--shard-ids", help="rebuild only these shards", type=int, nargs="+")
+
+    search_parser = subparsers.add_parser("search", help="run queries in batch mode (results as json lines)")
+    add_index_args(search_parser)
+    search_parser.add_argument("queries", help="queries (default: read from --query-file or stdin)", nargs="*")
+    search_parser.add_argument("--query-file", "-f", help="file with one query per line ('-' for stdin)")
+    search_parser.add_argument("--regex", help="interpret queries as regular expressions", action="store_true")
+    search_parser.add_argument(
+        "--boolean", "-b", help="interpret queries as boolean queries (AND, OR, NOT / -word, parentheses)", action="store_true"
+    )
+    search_parser.add_argument("--context-lines", help="lines around each match", type=int, default=3)
+    search_parser.add_argument(
+        "--max-snippets", help="maximum number of context windows per file (0: unlimited)", type=int, default=5
+    )
+    search_parser.add_argument(
+        "--top-k", "-k", help="only return the k files with the most matching lines (ordered by matches)", type=int
+    )
+    search_parser.add_argument("--jobs", "-j", help="number of parallel worker processes", type=int, default=1)
+    search_parser.add_argument("--shard-dir", help="search the sharded index in this directory (see `index --shards`)")
+
+    timeline_parser = subparsers.add_parser("timeline", help="count the occurrences of a word per week/month")
+    add_index_args(timeline_parser)
+    timeline_parser.add_argument("term", help="word to count")
+    timeline_parser.add_argument("--bucket", "-b", help="length of the periods", choices=["week", "month"], default="month")
+    timeline_parser.add_argument("--json", help="print the result as json", action="store_true")
+    timeline_parser.add_argument("--shard-dir", help="use the sharded index in this directory (see `index --shards`)")
+
+    compress_parser = subparsers.add_parser("compress", help="store transcripts compressed (with random access)")
+    compress_parser.add_argument("--directory", "-d", help="directory of the transcripts", default="output/fulltext")
+    compress_parser.add_argument("--json-directory", help="directory of the json files", default="output")
+    compress_parser.add_argument("--block-lines", help="number of lines per compressed block", type=int, default=256)
+    compress_parser.add_argument("--remove-originals", help="delete the uncompressed files", action="store_true")
+
+    loadtest_parser = subparsers.add_parser("loadtest", help="measure throughput and latency of the web app")
+    loadtest_parser.add_argument("--root", help="directory with transcripts in output/fulltext (default: synthetic)")
+    loadtest_parser.add_argument("--files", help="number of synthetic transcripts", type=int, default=200)
+    loadtest_parser.add_argument("--lines", help="lines per synthetic transcript", type=int, default=2000)
+    loadtest_parser.add_argument("--query-file", "-f", help="file with one search query per line")
+    loadtest_parser.add_argument("--processes", "-p", help="number of server processes", type=int, default=2)
+    loadtest_parser.add_argument("--threads", "-t", help="request threads per server process", type=int, default=4)
+    loadtest_parser.add_argument("--concurrency", "-c", help="number of concurrent clients", type=int, default=8)
+    loadtest_parser.add_argument("--duration", help="duration of the measurement (seconds)", type=float, default=10)
+    loadtest_parser.add_argument("--file-ratio", help="fraction of transcript views", type=float, default=0.3)
+    loadtest_parser.add_argument("--json", help="print the report as json", action="store_true")
+
+    profile_parser = subparsers.add_parser("profile-summary", help="show the hottest functions of profiled requests")
+    profile_parser.add_argument("directory", help="directory of the captured profiles", nargs="?", default="profiles")
+    profile_parser.add_argument("--endpoint", "-e", help="only requests of this view (e.g. home, show_file)")
+    profile_parser.add_argument("--top", "-n", help="number of functions/requests to show", type=int, default=20)
+    profile_parser.add_argument(
+        "--sort", "-s", help="sort key of the functions", choices=["cumulative", "tottime", "ncalls"], default="cumulative"
+    )
+
+    # the deploy arguments are parsed by a separate parser (which needs `deploymentutils`)
+    subparsers.add_parser("deploy", help="deploy the application (see `hakitool deploy -h`)", add_help=False)
+
+    args, remaining_args = parser.parse_known_args()
+    if remaining_args and args.command != "deploy":
+        parser.error(f"unrecognized arguments: {' '.join(remaining_args)}")
 
     # IPS()
     if args.version:
@@ -27,11 +105,163 @@ def main():
         from . import download
         download.main()
         return
+    elif args.command == "index":
+        run_index_command(args)
+        return
+    elif args.command == "search":
+        run_search_command(args)
+        return
+    elif args.command == "timeline":
+        run_timeline_command(args)
+        return
+    elif args.command == "loadtest":
+        from . import loadtest
+        loadtest.main(args)
+        return
+    elif args.command == "profile-summary":
+        from . import profiling
+        profiling.summarize(args.directory, endpoint=args.endpoint, top=args.top, sort=args.sort)
+        return
+    elif args.command == "compress":
+        run_compress_command(args)
+        return
     elif args.command == "run":
-        flask_app.main()
+        if args.asgi:
+            from . import asgi_app
+            asgi_app.main()
+        else:
+            from . import flask_app
+            flask_app.main()
         return
     elif args.command == "deploy":
-        deploy.main(args=args)
+        run_deploy_command(remaining_args)
         return
 
     parser.print_help()
+
+
+def add_index_args(parser):
+    parser.add_argument("--directory", "-d", help="directory of the transcripts", default="output/fulltext")
+    parser.add_argument("--index-file", help="path of the index file", default="file_index.pkl")
+
+
+def run_index_command(args):
+    if args.shards or args.shard_ids:
+        from .sharding import ShardedIndex
+        try:
+            sharded_index = ShardedIndex(args.directory, args.shard_dir, n_shards=args.shards, strategy=args.shard_strategy)
+            sharded_index.build(args.shard_ids, memory_budget_mb=args.memory_budget, dedup_threshold=args.dedup)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        return
+
+    from .search_engine import TextFileIndexer
+    TextFileIndexer(args.directory, args.index_file).build_index(
+        args.memory_budget, load=False, dedup_threshold=args.dedup
+    )
+
+
+def run_compress_command(args):
+    from pathlib import Path
+    from .transcript_store import compress_transcript, compress_json_file
+
+    txt_files = sorted(Path(args.directory).glob("*.txt"))
+    for filepath in txt_files:
+        compress_transcript(filepath, args.block_lines, remove_original=args.remove_originals)
+
+    json_files = sorted(Path(args.json_directory).glob("*.json"))
+    for filepath in json_files:
+        compress_json_file(filepath, remove_original=args.remove_originals)
+    print(f"compressed {len(txt_files)} transcripts and {len(json_files)} json files")
+
+
+def read_queries(args):
+    """Yield the queries from the command line, a query file or stdin (skipping empty lines)."""
+    if args.queries:
+        yield from args.queries
+        return
+
+    if args.query_file and args.query_file != "-":
+        f = open(args.query_file, encoding="utf-8")
+    else:
+        f = sys.stdin
+    with f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+@contextlib.contextmanager
+def open_index(args):
+    """Yield the loaded index of `search` or `timeline` (sharded if --shard-dir is given; exit if missing)."""
+    if args.shard_dir:
+        from .sharding import ShardedIndex, MANIFEST_NAME
+
+        if not os.path.exists(os.path.join(args.shard_dir, MANIFEST_NAME)):
+            print(f"No sharded index found in {args.shard_dir} (run `hakitool index --shards N` first)", file=sys.stderr)
+            sys.exit(1)
+        with ShardedIndex(args.directory, args.shard_dir) as sharded_index:
+            yield sharded_index
+        return
+
+    from .search_engine import TextFileIndexer
+
+    indexer = TextFileIndexer(args.directory, args.index_file)
+    if not indexer.load_index():
+        print(f"No index found at {args.index_file} (run `hakitool index` first)", file=sys.stderr)
+        sys.exit(1)
+    yield indexer
+
+
+def run_search_command(args):
+    from .search_engine import search_batch
+
+    jobs = args.jobs
+    if args.shard_dir and jobs > 1:
+        print("--jobs is ignored with --shard-dir (the shards are searched in parallel)", file=sys.stderr)
+        jobs = 1
+
+    out = sys.stdout
+    # diagnostic output goes to stderr such that stdout only contains json lines
+    with contextlib.redirect_stdout(sys.stderr), open_index(args) as indexer:
+        records = search_batch(
+            indexer,
+            read_queries(args),
+            jobs=jobs,
+            regex=args.regex,
+            boolean=args.boolean,
+            top_k=args.top_k,
+            context_lines=args.context_lines,
+            max_snippets=args.max_snippets or None,
+        )
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+
+def run_timeline_command(args):
+    with open_index(args) as indexer:
+        try:
+            timeline = indexer.get_term_timeline(args.term, args.bucket)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+
+    if args.json:
+        print(json.dumps(timeline, ensure_ascii=False))
+        return
+    for period in timeline:
+        print(f"{period['period']}\t{period['count']}\t({period['episodes']} episodes)")
+
+
+def run_deploy_command(deploy_args):
+    from . import deploy
+
+    if not deploy.REQUIREMENTS_INSTALLED:
+        sys.exit(1)
+
+    # add_help=False: the help option is among the arguments copied from deploymentutils
+    deploy_parser = argparse.ArgumentParser(prog="hakitool deploy", description="deploy the application", add_help=False)
+    deploy.DeploymentManager.add_deployment_args(deploy_parser)
+    deploy.main(args=deploy_parser.parse_args(deploy_args))
@@ -0,0 +1,162 @@
+"""
+Detection of near-duplicate transcripts (re-uploads, compilations) with MinHash and LSH.
+
+Every transcript is represented by the set of its word shingles (sequences of SHINGLE_SIZE
+consecutive words). The similarity of two transcripts is the Jaccard similarity of these sets,
+which is estimated from short signatures (one permutation hashing: every shingle is hashed once,
+the hash selects one of NUM_HASHES bins and the minimum per bin is kept).
+
+To find candidates without comparing all pairs, the signatures are split into BANDS bands; two
+transcripts are compared only if they agree in all values of at least one band (locality
+sensitive hashing). With 32 bands of 4 values, pairs with a similarity of 0.8 become candidates
+with a probability > 99.9 %, pairs with a similarity of 0.3 only with a probability of 23 %.
+
+Short transcripts fill only a few bins and their estimates are unreliable: bins which are empty
+in both signatures are ignored, bands without any shingle are not used for LSH and transcripts
+with less than MIN_SHINGLES shingles are never treated as duplicates.
+
+The detector keeps the signatures of all canonical transcripts in one array and the LSH buckets
+keyed by a single hash per band (about BYTES_PER_CANONICAL per transcript, which the index
+builder counts against its memory budget).
+"""
+
+import zlib
+from array import array
+from collections import deque
+
+SHINGLE_SIZE = 5
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+
+DEFAULT_THRESHOLD = 0.8
+
+# transcripts with fewer shingles are neither duplicates nor canonical copies
+MIN_SHINGLES = 50
+
+HASH_MASK = 2**64 - 1
+# value of bins without any shingle (only happens for short transcripts); the largest 64 bit
+# value such that signatures fit into unsigned 64 bit arrays (a shingle hash equal to it is
+# treated as empty, which is irrelevant in practice)
+EMPTY_BIN = HASH_MASK
+
+# approximate memory of a canonical transcript in the DuplicateDetector (signature and buckets)
+BYTES_PER_CANONICAL = NUM_HASHES * 8 + BANDS * 100
+
+
+class MinHasher:
+    def __init__(self, shingle_size: int = SHINGLE_SIZE) -> None:
+        """Compute the MinHash signature of a word sequence which is fed in pieces (e.g. lines)."""
+        self.window = deque(maxlen=shingle_size)
+        self.signature = [EMPTY_BIN] * NUM_HASHES
+        self.n_shingles = 0
+
+        # word -> crc32 (the hash of a shingle is the hash of the tuple of its word hashes; unlike
+        # the hash of strings this does not depend on PYTHONHASHSEED)
+        self.word_hashes = {}
+
+    def update(self, words: list[str]) -> None:
+        window = self.window
+        signature = self.signature
+        word_hashes = self.word_hashes
+        for word in words:
+            word_hash = word_hashes.get(word)
+            if word_hash is None:
+                word_hash = word_hashes[word] = zlib.crc32(word.encode("utf-8"))
+            window.append(word_hash)
+            if len(window) < window.maxlen:
+                continue
+            self.n_shingles += 1
+            value = hash(tuple(window)) & HASH_MASK
+            bin_id = value % NUM_HASHES
+            if value < signature[bin_id]:
+                signature[bin_id] = value
+
+    def digest(self) -> tuple[int, ...]:
+        return tuple(self.signature)
+
+
+def similarity(signature_a, signature_b) -> float:
+    """Estimate the Jaccard similarity of the shingle sets of two signatures.
+
+    Only bins which are filled in at least one of the signatures are compared (bins without a
+    shingle in both say nothing about the similarity).
+    """
+    matches = filled = 0
+    for a, b in zip(signature_a, signature_b):
+        if a != EMPTY_BIN or b != EMPTY_BIN:
+            filled += 1
+            matches += a == b
+    return matches / filled if filled else 0.0
+
+
+def _bands(signature):
+    """Yield the LSH bucket keys of a signature (bands without any shingle are skipped).
+
+    The key is a hash of the band number and its values (a collision only adds a candidate).
+    """
+    for band in range(BANDS):
+        values = signature[band * ROWS:(band + 1) * ROWS]
+        if any(value != EMPTY_BIN for value in values):
+            yield hash((band, *values))
+
+
+class DuplicateDetector:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD) -> None:
+        """Group transcripts which are added one by one into canonical copies and duplicates.
+
+        Args:
+            threshold: minimum estimated similarity of a duplicate to its canonical copy
+        """
+        self.threshold = threshold
+
+        # band key (see _bands) -> position (or list of positions) of canonical transcripts
+        self.buckets = {}
+        # signatures of the canonical transcripts (NUM_HASHES values per position)
+        self.signatures = array("Q")
+        # position -> id of canonical transcript
+        self.file_ids = []
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate memory of the stored signatures and buckets."""
+        return len(self.file_ids) * BYTES_PER_CANONICAL
+
+    def get_signature(self, position: int) -> array:
+        return self.signatures[position * NUM_HASHES:(position + 1) * NUM_HASHES]
+
+    def find_canonical(self, signature) -> int | None:
+        """Return the id of the most similar canonical transcript above the threshold (or None)."""
+        if all(value == EMPTY_BIN for value in signature):
+            # no shingle at all (e.g. empty file): nothing to compare
+            return None
+
+        candidates = set()
+        for key in _bands(signature):
+            positions = self.buckets.get(key)
+            if isinstance(positions, int):
+                candidates.add(positions)
+            elif positions is not None:
+                candidates.update(positions)
+
+        best_position, best_similarity = None, self.threshold
+        for candidate in sorted(candidates):
+            candidate_similarity = similarity(signature, self.get_signature(candidate))
+            if candidate_similarity >= best_similarity:
+                best_position, best_similarity = candidate, candidate_similarity
+        return self.file_ids[best_position] if best_position is not None else None
+
+    def add_canonical(self, file_id: int, signature) -> None:
+        """Register a transcript which is no duplicate (later transcripts are compared to it)."""
+        position = len(self.file_ids)
+        self.file_ids.append(file_id)
+        self.signatures.extend(signature)
+        for key in _bands(signature):
+            # most buckets contain a single transcript: store it without a list
+            positions = self.buckets.get(key)
+            if positions is None:
+                self.buckets[key] = position
+            elif isinstance(positions, int):
+                self.buckets[key] = [positions, position]
+            else:
+                positions.append(position)
@@ -5,8 +5,8 @@ import requests
 from datetime import datetime
 from youtube_transcript_api import YouTubeTranscriptApi
 
-from ipydex import IPS, activate_ips_on_exception
-activate_ips_on_exception()
+from .transcript_store import load_json_file
+from .metadata import PODCAST_NAME
 
 def slugify(text):
     """Convert text to a filename-safe slug"""
@@ -58,12 +58,12 @@ def get_existing_video_urls_from_downloaded_json_files():
     output_dir = "./output"
     if os.path.exists(output_dir):
         for filename in os.listdir(output_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(output_dir, filename)
+            # json files might be compressed (see transcript_store.py)
+            if filename.endswith('.json') or filename.endswith('.json.gz'):
+                filepath = os.path.join(output_dir, filename.removesuffix('.gz'))
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        existing_urls.add(data['video_url'])
+                    data = load_json_file(filepath)
+                    existing_urls.add(data['video_url'])
                 except (json.JSONDecodeError, KeyError):
                     continue
     return existing_urls
@@ -123,6 +123,7 @@ def download_german_subtitles(video_url, existing_urls=None):
             "video_title": video_title,
             "video_url": video_url,
             "publish_date": publish_date,
+            "podcast": PODCAST_NAME,
             "language": "de",
             "transcript_snippets": transcript_obj.to_raw_data(),
         }
@@ -149,6 +150,10 @@ def download_german_subtitles(video_url, existing_urls=None):
 def main():
     import time
 
+    # simplify debugging (imported here because ipydex is slow to import)
+    from ipydex import activate_ips_on_exception
+    activate_ips_on_exception()
+
     # Example playlist URL - replace with your desired playlist
     playlist_url = "https://www.youtube.com/playlist?list=PLMsZgEMEKvQKQDNhrHnxY9ScIcWMq5qzf"
 
@@ -1,12 +1,18 @@
 import os
+import re
 import sys
+import time
+import atexit
 import logging
+import threading
 
 import deploymentutils as du
-from ipydex import IPS, activate_ips_on_exception
 
-from flask import Flask, render_template, request, redirect, url_for, abort
+from flask import Flask, render_template, request, redirect, url_for, abort, jsonify
 from .search_engine import TextFileIndexer
+from .metadata import MetadataFilter, parse_query
+from .transcript_store import read_transcript_lines
+from .profiling import RequestProfiler
 from . import util
 
 
@@ -19,6 +25,9 @@ APP_NAME = "hakitool"
 c = Container()
 c.LOGFILENAME = f"{APP_NAME}.log"
 
+# one line per search (query, number of hits, duration)
+access_logger = logging.getLogger(f"{APP_NAME}.access")
+
 # this assumes the package is installed with `pip install -e .`
 c.PROJECT_ROOT_PATH = os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 assert os.path.isfile(os.path.join(c.PROJECT_ROOT_PATH, "pyproject.toml"))
@@ -51,17 +60,23 @@ def init(confpath="config.toml", test_mode=False):
     file_handler = logging.FileHandler(c.LOGFILENAME)
     file_handler.setFormatter(no_color_formatter)
 
-    logging.basicConfig(level=loglevel, handlers=[
-        file_handler,
-        stdout_handler
-    ])
+    # the handlers run in a background thread such that slow writes do not delay requests
+    if getattr(c, "log_writer", None) is not None:
+        c.log_writer.stop()
+    c.log_writer = util.BackgroundLogWriter([file_handler, stdout_handler])
+    logging.basicConfig(level=loglevel, handlers=[c.log_writer.queue_handler], force=True)
+    c.log_writer.start()
+    atexit.register(c.log_writer.stop)
+
+    # the access log is always written to the log file (stdout only shows it for loglevel INFO/DEBUG)
+    access_logger.setLevel(logging.INFO)
 
     if os.getenv("USER") == c.cfg("dep::user"):
         c.HOSTTYPE = "SERVER"
     else:
         c.HOSTTYPE = "LOCAL"
 
-    c.logger.info(f"{APP_NAME} started with {c.HOSTTYPE=} and loglevel {LOGLEVEL}")
+    c.logger.info("%s started with c.HOSTTYPE=%r and loglevel %s", APP_NAME, c.HOSTTYPE, LOGLEVEL)
 
 
 def nested_to_html(data, indent=0):
@@ -78,7 +93,7 @@ def nested_to_html(data, indent=0):
 
 
 def create_app(config=None):
-    c.logger.debug(f"creating app object")
+    c.logger.debug("creating app object")
 
     app = Flask(__name__, instance_relative_config=True, root_path=c.PROJECT_ROOT_PATH)
 
@@ -96,10 +111,51 @@ def create_app(config=None):
 
 
     app.config['SEARCH_DIRECTORY'] = "output/fulltext"
+
+    # user supplied regular expressions can take (practically) forever with python's
+    # backtracking `re` and can not be interrupted: only enable them for trusted users
+    app.config['ALLOW_REGEX'] = False
+
+    # opt-in profiling of requests (see profiling.py)
+    app.config['PROFILE_DIR'] = "profiles"
+    app.config['PROFILE_SAMPLE_RATE'] = 0.0
+    app.config['PROFILE_TOKEN'] = None
+
+    # e.g. HAKITOOL_PROFILE_SAMPLE_RATE=0.01 or HAKITOOL_ALLOW_REGEX=true
+    app.config.from_prefixed_env("HAKITOOL")
+    if config is not None:
+        app.config.update(config)
+
     indexer = TextFileIndexer(app.config['SEARCH_DIRECTORY'])
+    index_lock = threading.Lock()
+    # modification time of the index file when loading it failed last (None: file is missing)
+    failed_index_mtime = False
+    profiler = RequestProfiler.from_config(app.config)
+    if profiler.enabled:
+        c.logger.info("profiling requests (sample rate %s) to %s", profiler.sample_rate, profiler.output_dir)
+
+    def ensure_index_loaded() -> None:
+        """Load the index on the first request (concurrent first requests load it only once).
 
+        If loading fails (missing or outdated index) it is only tried again once the index file changed.
+        """
+        nonlocal failed_index_mtime
+        if indexer.index:
+            return
+        with index_lock:
+            if indexer.index:
+                return
+            try:
+                mtime = os.stat(indexer.index_file).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == failed_index_mtime:
+                return
+            if not indexer.load_index():
+                failed_index_mtime = mtime
 
     @app.route('/', methods=['GET', 'POST'])
+    @profiler.profile
     def home() -> str:
         """Handle the main search page and form submission.
 
@@ -109,29 +165,101 @@ def create_app(config=None):
         Returns:
             str: Rendered HTML template
         """
-        # Try to load index on first request
-        if not hasattr(indexer, 'index') or not indexer.index:
-            indexer.load_index()
+        ensure_index_loaded()
 
         if request.method == 'POST':
             search_term = request.form.get('search_term', '').strip()
-            if search_term:
-
-                results = indexer.search_in_files(search_term)
-                c.logger.debug(f"Template folder: {app.template_folder}")
-                c.logger.debug(f"App root path: {app.root_path}")
+            regex = bool(request.form.get('regex'))
+            boolean = bool(request.form.get('boolean'))
+            if regex and not app.config['ALLOW_REGEX']:
+                return render_template('results.html', search_term=search_term, results=[],
+                                       error="regular expressions are disabled on this server")
+            try:
+                # filters can be given as form fields or inside the query (e.g. `from:2025-01-01`)
+                text, metadata_filter = parse_query(search_term)
+                form_filter = MetadataFilter(
+                    date_from=request.form.get('date_from') or None,
+                    date_to=request.form.get('date_to') or None,
+                    title=request.form.get('title', '').strip() or None,
+                )
+            except ValueError as e:
+                return render_template('results.html', search_term=search_term, results=[], error=f"invalid filter: {e}")
+            metadata_filter.date_from = form_filter.date_from or metadata_filter.date_from
+            metadata_filter.date_to = form_filter.date_to or metadata_filter.date_to
+            metadata_filter.title = form_filter.title or metadata_filter.title
+
+            if text:
+                start_time = time.perf_counter()
+                try:
+                    results = indexer.search_in_files(
+                        text,
+                        regex=regex,
+                        boolean=boolean,
+                        cancel_event=request.environ.get("hakitool.cancel_event"),
+                        metadata_filter=metadata_filter,
+                    )
+                except re.error as e:
+                    return render_template('results.html',
+                                        search_term=search_term,
+                                        results=[],
+                                        error=f"invalid regular expression: {e}")
+                except ValueError as e:
+                    # QuerySyntaxError or boolean combined with regex
+                    return render_template('results.html',
+                                        search_term=search_term,
+                                        results=[],
+                                        error=f"invalid query: {e}")
+                access_logger.info(
+                    "search query=%r regex=%d boolean=%d filter=%r files=%d matches=%d ms=%.1f",
+                    text,
+                    regex,
+                    boolean,
+                    metadata_filter,
+                    len(results),
+                    sum(n_matches for _, _, n_matches in results),
+                    (time.perf_counter() - start_time) * 1000,
+                )
+                c.logger.debug("Template folder: %s", app.template_folder)
+                c.logger.debug("App root path: %s", app.root_path)
                 return render_template('results.html',
-                                    search_term=search_term,
-                                    results=results)
+                                    search_term=text,
+                                    results=results,
+                                    aliases=indexer.aliases)
             return redirect(url_for('home'))
 
-        c.logger.debug(f"Template folder: {app.template_folder}")
-        c.logger.debug(f"App root path: {app.root_path}")
-        return render_template('index.html')
+        c.logger.debug("Template folder: %s", app.template_folder)
+        c.logger.debug("App root path: %s", app.root_path)
+        return render_template('index.html', allow_regex=app.config['ALLOW_REGEX'])
+
+    @app.route('/timeline')
+    def timeline():
+        """Return how often a word occurs per week or month as json.
+
+        Query parameters: `term` (single word), `bucket` ("week" or "month", default "month")
+        and optionally `podcast`, `title`, `from`, `to` to restrict the counted episodes.
+        """
+        ensure_index_loaded()
+
+        term = request.args.get('term', '')
+        bucket = request.args.get('bucket', 'month')
+        try:
+            metadata_filter = MetadataFilter(
+                date_from=request.args.get('from') or None,
+                date_to=request.args.get('to') or None,
+                title=request.args.get('title') or None,
+                podcast=request.args.get('podcast') or None,
+            )
+            periods = indexer.get_term_timeline(term, bucket, metadata_filter)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        return jsonify(term=term.strip().lower(), bucket=bucket, timeline=periods)
 
     @app.route('/file/<path:filename>')
+    @profiler.profile
     def show_file(filename: str) -> str:
-        """Show full file content with all matches highlighted.
+        """Show file content (optionally only the lines start...end) with all matches highlighted.
+
+        For compressed transcripts only the blocks containing the requested lines are read.
 
         Args:
             filename: Path to the file to display
@@ -139,36 +267,44 @@ def create_app(config=None):
         Returns:
             str: Rendered template with file content
         """
+        search_term = request.args.get('search_term', '')
+        start_line = max(1, request.args.get('start', 1, type=int))
+        end_line = request.args.get('end', None, type=int)
         try:
-            with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-                search_term = request.args.get('search_term', '')
-                content = f.read()
-            c.logger.debug(f"Template folder: {app.template_folder}")
-            c.logger.debug(f"App root path: {app.root_path}")
-            return render_template('file_view.html',
-                                filename=filename,
-                                content=content,
-                                search_term=search_term)
+            content = ''.join(read_transcript_lines(filename, start_line - 1, end_line))
         except Exception as e:
             abort(404)
+        c.logger.debug("Template folder: %s", app.template_folder)
+        c.logger.debug("App root path: %s", app.root_path)
+        return render_template('file_view.html',
+                            filename=filename,
+                            content=content,
+                            start_line=start_line,
+                            partial=start_line > 1 or end_line is not None,
+                            search_term=search_term)
 
     return app
 
 
 def main():
     init()
-    app = create_app()
+    # the local development server may use regular expressions
+    app = create_app({"ALLOW_REGEX": True})
     c.logger.info("start app in debug mode")
     app.run(host='0.0.0.0', port=8000, debug=True)
 
 
+# the app of the uwsgi worker (created on the first request)
+_uwsgi_app = None
+
+
 def uwsgi_entry(*args, **kwargs):
-    init()
-    app = create_app()
-    c.logger.info("start flask app via uwsgi")
-    c.logger.debug(f"{args=}")
-    c.logger.debug(f"{kwargs=}")
-    return app(*args, **kwargs)
+    global _uwsgi_app
+    if _uwsgi_app is None:
+        init()
+        _uwsgi_app = create_app()
+        c.logger.info("start flask app via uwsgi")
+    return _uwsgi_app(*args, **kwargs)
 
 if __name__ == "__main__":
     main()
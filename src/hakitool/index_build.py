@@ -0,0 +1,277 @@
+"""
+Memory-bounded construction of the index file.
+
+Files are tokenized line by line. The postings (term -> file ids) are collected in a buffer
+which is written to disk as a sorted "run" whenever it exceeds the memory budget. Finally all
+runs are k-way merged into the index file. At most MERGE_FAN_IN runs are merged at once (if
+there are more runs, groups of them are first merged into larger runs) and the runs are read in
+chunks of a fraction of the budget. Thus the memory and the number of open files needed for
+building the index depend on the budget (and the largest single file and term) but not on the
+size of the corpus.
+
+Optionally near-duplicate transcripts are detected while tokenizing (see dedup.py): only the
+first copy is indexed, the others are recorded as its aliases.
+
+Format of the index file: a sequence of pickled objects. The first object is a header dict
+(index_version, files, metadata, aliases). All following objects are lists of (kind, term, postings)
+records where postings is a sorted list of file ids. For the kind WORD_COUNT the "postings" are
+the numbers of occurrences of the word, aligned with the postings of the same word (kind WORD).
+"""
+
+import os
+import re
+import heapq
+import pickle
+import shutil
+import tempfile
+import itertools
+from collections import Counter
+
+from .transcript_store import iter_transcript_lines
+from .dedup import MIN_SHINGLES, DuplicateDetector, MinHasher
+
+
+# increase this if the structure of the index file changes
+INDEX_VERSION = 5
+
+# kinds of terms
+WORD = "w"
+TRIGRAM = "t"
+# number of occurrences of a word per file (aligned with the WORD postings)
+WORD_COUNT = "c"
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# rough estimates of the memory which the buffer needs per term and per posting
+BYTES_PER_TERM = 150
+BYTES_PER_POSTING = 8
+
+# maximum number of runs which are merged at once
+MERGE_FAN_IN = 16
+
+# part of the budget which is always available for the buffer (even if the signatures of the
+# duplicate detection need more than the rest, i.e. then the budget is exceeded)
+MIN_BUFFER_FRACTION = 0.1
+
+WORD_RE = re.compile(r"\w+")
+
+
+def iter_lines(filepath):
+    """Yield the lowercase lines (without line break) of a transcript one by one."""
+    for line in iter_transcript_lines(filepath):
+        yield line.rstrip("\n").lower()
+
+
+def get_file_terms(filepath, minhasher: MinHasher | None = None) -> tuple[Counter, set[str]]:
+    """Return the word counts and the set of trigrams of a text file (which is read line by line).
+
+    Args:
+        filepath: path of the transcript
+        minhasher: optional MinHasher which is fed with the words of the file
+    """
+    words = Counter()
+    trigrams = set()
+    for line in iter_lines(filepath):
+        line_words = WORD_RE.findall(line)
+        words.update(line_words)
+        if minhasher is not None:
+            minhasher.update(line_words)
+        trigrams.update([line[i:i + 3] for i in range(len(line) - 2)])
+    return words, trigrams
+
+
+def _record_size(record) -> int:
+    return BYTES_PER_TERM + len(record[2]) * BYTES_PER_POSTING
+
+
+def iter_sized_chunks(records, max_bytes: float):
+    """Group records into chunks of approximately at most max_bytes (at least one record each)."""
+    chunk = []
+    size = 0
+    for record in records:
+        chunk.append(record)
+        size += _record_size(record)
+        if size >= max_bytes:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def iter_pickled_chunks(f):
+    """Yield the elements of all pickled lists until the end of the open file f."""
+    while True:
+        try:
+            chunk = pickle.load(f)
+        except EOFError:
+            return
+        yield from chunk
+
+
+def iter_run(path: str):
+    with open(path, "rb") as f:
+        yield from iter_pickled_chunks(f)
+
+
+def _record_key(record):
+    return record[:2]
+
+
+def merge_runs(runs):
+    """k-way merge of sorted runs of (kind, term, postings) records.
+
+    The runs must be given in the order they were created (i.e. with increasing file ids),
+    then concatenating the postings of equal terms keeps them sorted.
+
+    Args:
+        runs: iterables of records sorted by (kind, term)
+
+    Yields:
+        tuple: (kind, term, postings) in sorted order
+    """
+    # heapq.merge is stable: records with equal keys are yielded in the order of the runs
+    merged = heapq.merge(*runs, key=_record_key)
+    for (kind, term), records in itertools.groupby(merged, key=_record_key):
+        postings = []
+        for record in records:
+            postings.extend(record[2])
+        yield kind, term, postings
+
+
+class IndexBuilder:
+    def __init__(
+        self, index_file: str, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, dedup_threshold: float | None = None
+    ) -> None:
+        """Collect the terms of many files and write them as index file.
+
+        Args:
+            index_file: path of the resulting index file
+            memory_budget_mb: approximate maximum size of the in-memory buffer
+            dedup_threshold: if given, files with at least this (estimated) similarity to an
+                already added file are not indexed but recorded as its aliases (the signatures
+                which are kept for this count against the memory budget)
+        """
+        self.index_file = index_file
+        self.max_buffer_size = memory_budget_mb * 1e6
+        self.fan_in = MERGE_FAN_IN
+        self.files = []
+
+        self.detector = DuplicateDetector(dedup_threshold) if dedup_threshold is not None else None
+        # indexed filepath -> filepaths of its near-duplicates
+        self.aliases = {}
+
+        # (kind, term) -> list of file ids (or word counts for kind WORD_COUNT)
+        self.buffer = {}
+        self.buffer_size = 0
+        self.run_paths = []
+        self.n_written_runs = 0
+        self.run_dir = tempfile.mkdtemp(
+            prefix="hakitool_runs_", dir=os.path.dirname(os.path.abspath(index_file))
+        )
+
+    def add_file(self, filepath) -> int | None:
+        """Tokenize a file and add its terms; return the new file id (None if it is a near-duplicate)."""
+        minhasher = MinHasher() if self.detector is not None else None
+        words, trigrams = get_file_terms(filepath, minhasher)
+        file_id = len(self.files)
+
+        if minhasher is not None and minhasher.n_shingles >= MIN_SHINGLES:
+            signature = minhasher.digest()
+            canonical_id = self.detector.find_canonical(signature)
+            if canonical_id is not None:
+                self.aliases.setdefault(self.files[canonical_id], []).append(str(filepath))
+                return None
+            self.detector.add_canonical(file_id, signature)
+
+        self.files.append(str(filepath))
+
+        n_terms = len(self.buffer)
+        for word, count in words.items():
+            self.buffer.setdefault((WORD, word), []).append(file_id)
+            self.buffer.setdefault((WORD_COUNT, word), []).append(count)
+        for term in trigrams:
+            self.buffer.setdefault((TRIGRAM, term), []).append(file_id)
+        n_postings = 2 * len(words) + len(trigrams)
+        self.buffer_size += (len(self.buffer) - n_terms) * BYTES_PER_TERM + n_postings * BYTES_PER_POSTING
+
+        if self.buffer_size >= self.available_bytes:
+            self.flush_run()
+        return file_id
+
+    @property
+    def available_bytes(self) -> float:
+        """Part of the budget which is not used by the duplicate detector (but at least MIN_BUFFER_FRACTION)."""
+        detector_bytes = self.detector.memory_bytes if self.detector is not None else 0
+        return max(self.max_buffer_size - detector_bytes, MIN_BUFFER_FRACTION * self.max_buffer_size)
+
+    def _sorted_buffer_records(self) -> list[tuple]:
+        return [(kind, term, postings) for (kind, term), postings in sorted(self.buffer.items())]
+
+    @property
+    def run_chunk_bytes(self) -> float:
+        """Size of the pickled chunks: a merge holds one chunk per input run and the output chunk."""
+        return self.available_bytes / (self.fan_in + 1)
+
+    def _write_run(self, records) -> str:
+        path = os.path.join(self.run_dir, f"run_{self.n_written_runs}.pkl")
+        self.n_written_runs += 1
+        with open(path, "wb") as f:
+            for chunk in iter_sized_chunks(records, self.run_chunk_bytes):
+                pickle.dump(chunk, f)
+        return path
+
+    def flush_run(self) -> None:
+        """Write the sorted buffer to a new run file."""
+        self.run_paths.append(self._write_run(self._sorted_buffer_records()))
+        self.buffer = {}
+        self.buffer_size = 0
+
+    def _merge_passes(self) -> None:
+        """Merge groups of consecutive runs until at most fan_in runs are left.
+
+        Consecutive runs are merged (in the order of creation) such that the postings of the
+        merged runs stay sorted.
+        """
+        while len(self.run_paths) > self.fan_in:
+            run_paths = []
+            for i in range(0, len(self.run_paths), self.fan_in):
+                group = self.run_paths[i:i + self.fan_in]
+                if len(group) == 1:
+                    run_paths.extend(group)
+                    continue
+                run_paths.append(self._write_run(merge_runs([iter_run(path) for path in group])))
+                for path in group:
+                    os.remove(path)
+            self.run_paths = run_paths
+
+    def finish(self, header: dict) -> None:
+        """Merge all runs (and the remaining buffer) into the index file.
+
+        The file is written under a temporary name and renamed at the end such that readers
+        never see an incomplete index.
+
+        Args:
+            header: first object of the index file
+        """
+        # the signatures are not needed anymore, their memory is available for merging
+        self.detector = None
+        if self.run_paths:
+            # the remaining buffer becomes a run as well, then its memory is available for reading
+            if self.buffer:
+                self.flush_run()
+            self._merge_passes()
+            runs = [iter_run(path) for path in self.run_paths]
+        else:
+            runs = [self._sorted_buffer_records()]
+            self.buffer = {}
+
+        tmp_path = f"{self.index_file}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(header, f)
+            for chunk in iter_sized_chunks(merge_runs(runs), self.run_chunk_bytes):
+                pickle.dump(chunk, f)
+        os.replace(tmp_path, self.index_file)
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.run_dir, ignore_errors=True)
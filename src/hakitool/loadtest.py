@@ -0,0 +1,327 @@
+"""
+End-to-end load test of the flask app against a synthetic corpus.
+
+The app is served by several worker processes (werkzeug server, each with a fixed number of
+request threads, like `processes` / `threads` of uwsgi). A client with a fixed number of
+concurrent connections replays a mix of searches (POST /) and transcript views (GET /file/...)
+and reports throughput, latency percentiles and the peak memory of every worker. This allows
+to size the uwsgi configuration from measurements.
+
+Usage:
+
+    hakitool loadtest --processes 2 --threads 4 --concurrency 8 --duration 20
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import contextlib
+import logging
+import datetime
+import tempfile
+import threading
+import multiprocessing
+import urllib.parse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+from .query import is_boolean_query
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+
+# searches of the default query mix: frequent, rare and unknown words, phrases, boolean, filters
+DEFAULT_QUERIES = [
+    "klima",
+    "mastodon",
+    "bluesky moderation",
+    "desinformation",
+    "plattform",
+    "klima OR mastodon -werbung",
+    "xyzzy",
+    "algorithmus from:2025-01-01",
+]
+
+# words of the synthetic transcripts (the first ones occur more often)
+VOCABULARY = (
+    "und die der das ist nicht ein wir auch mit es zu auf sie so dann aber schon mal noch "
+    "plattform mastodon bluesky threads twitter klima moderation algorithmus werbung nutzer "
+    "desinformation datenschutz regulierung community podcast episode fediverse"
+).split()
+
+
+def make_corpus(root: str, n_files: int = 200, n_lines: int = 2000, n_long_files: int = 2, seed: int = 0) -> list[str]:
+    """Write synthetic transcripts to `<root>/output/fulltext` (the default search directory).
+
+    Args:
+        root: directory which is used as working directory of the app
+        n_files: number of regular transcripts
+        n_lines: number of lines per regular transcript
+        n_long_files: number of additional transcripts which are ten times longer
+        seed: seed of the random generator
+
+    Returns:
+        list[str]: paths of the transcripts relative to root
+    """
+    rng = random.Random(seed)
+    directory = os.path.join(root, "output", "fulltext")
+    os.makedirs(directory, exist_ok=True)
+
+    # zipf-like distribution of the words
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    first_date = datetime.date(2024, 10, 1)
+    paths = []
+    for i in range(n_files + n_long_files):
+        lines = n_lines if i < n_files else 10 * n_lines
+        date = first_date + datetime.timedelta(days=7 * (i % 52))
+        path = os.path.join("output", "fulltext", f"{date.isoformat()}_episode-{i}.txt")
+        with open(os.path.join(root, path), "w", encoding="utf-8") as f:
+            for _ in range(lines):
+                f.write(" ".join(rng.choices(VOCABULARY, weights, k=rng.randint(4, 12))) + "\n")
+        paths.append(path)
+    return paths
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Return the p-th percentile (0...100) of a sorted list (nearest rank)."""
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def get_peak_rss_mb() -> float | None:
+    """Return the peak resident memory of the current process in MB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux: kilobytes, macos: bytes
+    return round(peak / 1e6 if sys.platform == "darwin" else peak / 1e3, 1)
+
+
+def limit_concurrency(wsgi_app, n_threads: int):
+    """Let at most n_threads requests execute the app at the same time (others wait)."""
+    semaphore = threading.BoundedSemaphore(n_threads)
+
+    def app(environ, start_response):
+        with semaphore:
+            return wsgi_app(environ, start_response)
+
+    return app
+
+
+def _serve_worker(conn, root: str, n_threads: int) -> None:
+    """Main function of a server process: serve the app until anything is received via conn."""
+    from werkzeug.serving import make_server
+    from . import flask_app
+
+    os.chdir(root)
+    # the app only logs via this logger (flask_app.init needs a deployment config)
+    flask_app.c.logger = logging.getLogger(flask_app.APP_NAME)
+    # request logs and diagnostic output of the search engine would disturb the report
+    logging.getLogger("werkzeug").disabled = True
+    sys.stdout = open(os.devnull, "w")
+
+    app = flask_app.create_app()
+    server = make_server("127.0.0.1", 0, limit_concurrency(app, n_threads), threaded=True)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    conn.send(server.server_port)
+
+    conn.recv()
+    server.shutdown()
+    conn.send({"pid": os.getpid(), "peak_rss_mb": get_peak_rss_mb()})
+    conn.close()
+
+
+def _build_requests(queries: list[str], paths: list[str], file_ratio: float, n: int, seed: int) -> list[tuple]:
+    """Create a random sequence of (kind, path, form data) requests."""
+    rng = random.Random(seed)
+    request_mix = []
+    for _ in range(n):
+        if rng.random() < file_ratio:
+            path = rng.choice(paths)
+            params = {"search_term": rng.choice(queries)}
+            if rng.random() < 0.5:
+                # window around a snippet (like the links of the result page)
+                start = rng.randint(1, 1000)
+                params.update(start=start, end=start + 100)
+            url_path = f"/file/{urllib.parse.quote(path)}?{urllib.parse.urlencode(params)}"
+            request_mix.append(("file", url_path, None))
+        else:
+            query = rng.choice(queries)
+            form = {"search_term": query}
+            if is_boolean_query(query):
+                form["boolean"] = "1"
+            request_mix.append(("search", "/", form))
+    return request_mix
+
+
+def _send(base_url: str, request: tuple, timeout: float) -> tuple[str, float, int]:
+    kind, path, form = request
+    data = urllib.parse.urlencode(form).encode() if form is not None else None
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base_url + path, data=data, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return kind, time.perf_counter() - start, status
+
+
+def run_load_test(
+    root: str | None = None,
+    queries: list[str] | None = None,
+    processes: int = 2,
+    threads: int = 4,
+    concurrency: int = 8,
+    duration: float = 10.0,
+    file_ratio: float = 0.3,
+    n_files: int = 200,
+    n_lines: int = 2000,
+    timeout: float = 30.0,
+    seed: int = 0,
+) -> dict:
+    """Start the app on a synthetic corpus and measure it under load.
+
+    Args:
+        root: working directory with an existing corpus in `output/fulltext`
+            (default: generate a new corpus in a temporary directory)
+        queries: search queries to replay (default: DEFAULT_QUERIES)
+        processes: number of server processes (requests are distributed round robin)
+        threads: number of requests every server process executes at the same time
+        concurrency: number of concurrent client connections
+        duration: length of the measurement in seconds
+        file_ratio: fraction of requests which view a transcript instead of searching
+        n_files: number of generated transcripts
+        n_lines: number of lines per generated transcript
+        timeout: timeout of a single request in seconds
+        seed: seed of the random generator (corpus and request sequence)
+
+    Returns:
+        dict: report with throughput, latencies per kind of request and worker memory
+    """
+    from .search_engine import TextFileIndexer
+
+    with tempfile.TemporaryDirectory(prefix="hakitool_loadtest_") as tmp_dir:
+        if root is None:
+            root = tmp_dir
+            print(f"generating {n_files} transcripts in {root} ...", file=sys.stderr)
+            make_corpus(root, n_files, n_lines, seed=seed)
+        indexer = TextFileIndexer(os.path.join(root, "output", "fulltext"), os.path.join(root, "file_index.pkl"))
+        if not os.path.exists(indexer.index_file):
+            # progress goes to stderr such that stdout only contains the report (e.g. as json)
+            with contextlib.redirect_stdout(sys.stderr):
+                indexer.build_index(load=False)
+        paths = [os.path.relpath(path, root) for path in indexer.get_txt_files()]
+
+        workers = []
+        for _ in range(processes):
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_worker, args=(worker_conn, root, threads), daemon=True)
+            process.start()
+            workers.append((process, conn))
+        base_urls = [f"http://127.0.0.1:{conn.recv()}" for _, conn in workers]
+
+        request_mix = _build_requests(queries or DEFAULT_QUERIES, paths, file_ratio, 10000, seed)
+        # warm up: every worker loads its index
+        for base_url in base_urls:
+            _send(base_url, request_mix[0], timeout)
+
+        measurements = []
+        counter = iter(range(sys.maxsize))
+        lock = threading.Lock()
+        end_time = time.perf_counter() + duration
+
+        def client():
+            while time.perf_counter() < end_time:
+                with lock:
+                    i = next(counter)
+                measurements.append(_send(base_urls[i % len(base_urls)], request_mix[i % len(request_mix)], timeout))
+
+        print(f"running {concurrency} clients against {processes} x {threads} workers for {duration} s ...", file=sys.stderr)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(client) for _ in range(concurrency)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        worker_stats = []
+        for process, conn in workers:
+            conn.send("stop")
+            worker_stats.append(conn.recv())
+            process.join()
+
+    return _make_report(measurements, elapsed, worker_stats, processes, threads, concurrency)
+
+
+def _make_report(measurements: list[tuple], elapsed: float, worker_stats: list[dict], processes, threads, concurrency) -> dict:
+    report = {
+        "processes": processes,
+        "threads": threads,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(measurements),
+        "errors": sum(1 for _, _, status in measurements if status != 200),
+        "throughput_rps": round(len(measurements) / elapsed, 1),
+        "latency_ms": {},
+        "workers": worker_stats,
+    }
+    for kind in ("search", "file"):
+        latencies = sorted(latency * 1000 for k, latency, _ in measurements if k == kind)
+        report["latency_ms"][kind] = {
+            "n": len(latencies),
+            **{f"p{p}": round(percentile(latencies, p), 1) for p in (50, 90, 99)},
+            "max": round(latencies[-1], 1) if latencies else None,
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"\n{report['requests']} requests in {report['duration_s']} s: {report['throughput_rps']} req/s "
+        f"({report['errors']} errors; {report['processes']} processes x {report['threads']} threads, "
+        f"{report['concurrency']} clients)"
+    )
+    print(f"\n{'latency [ms]':<14}{'n':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for kind, stats in report["latency_ms"].items():
+        values = "".join(f"{stats[key] if stats[key] is not None else '-':>9}" for key in ("p50", "p90", "p99", "max"))
+        print(f"{kind:<14}{stats['n']:>7}{values}")
+    print()
+    for worker in report["workers"]:
+        print(f"worker {worker['pid']}: peak RSS {worker['peak_rss_mb'] or '?'} MB")
+
+
+def main(args) -> None:
+    """Run the load test with the arguments of `hakitool loadtest`."""
+    queries = None
+    if args.query_file:
+        with open(args.query_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    report = run_load_test(
+        root=args.root,
+        queries=queries,
+        processes=args.processes,
+        threads=args.threads,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        file_ratio=args.file_ratio,
+        n_files=args.files,
+        n_lines=args.lines,
+    )
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
@@ -0,0 +1,162 @@
+"""
+Episode metadata (publish date, title, video id, podcast) stored column-wise and aligned
+with the file ids of the index. Filters are evaluated on this table before any transcript
+is opened.
+"""
+
+import re
+import json
+import datetime
+from array import array
+from pathlib import Path
+
+from .util import get_publish_date
+from .transcript_store import load_json_file
+
+
+# podcast of the transcripts fetched by download.py (json files of older downloads have no "podcast" key)
+PODCAST_NAME = "Haken Dran"
+
+# query tokens like `from:2025-01-01` or `title:"haken dran"`
+FILTER_TOKEN_RE = re.compile(r'\b(from|to|title|podcast):(?:"([^"]*)"|(\S+))')
+
+
+class MetadataFilter:
+    def __init__(
+        self,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        title: str | None = None,
+        podcast: str | None = None,
+    ) -> None:
+        """Restrict a search to episodes with matching metadata.
+
+        Args:
+            date_from: earliest publish date ('YYYY-MM-DD', inclusive)
+            date_to: latest publish date ('YYYY-MM-DD', inclusive)
+            title: case insensitive substring of the episode title
+            podcast: case insensitive substring of the podcast name
+        """
+        self.date_from = _parse_date(date_from)
+        self.date_to = _parse_date(date_to)
+        self.title = title.lower() if title else None
+        self.podcast = podcast.lower() if podcast else None
+
+    def is_empty(self) -> bool:
+        return not any((self.date_from, self.date_to, self.title, self.podcast))
+
+    def __repr__(self) -> str:
+        items = (f"{key}={value!r}" for key, value in vars(self).items() if value)
+        return f"MetadataFilter({', '.join(items)})"
+
+
+def _parse_date(value: str | None) -> int:
+    """Convert 'YYYY-MM-DD' to a proleptic ordinal (0 means: no date)."""
+    if not value:
+        return 0
+    return datetime.date.fromisoformat(value).toordinal()
+
+
+def parse_query(query: str) -> tuple[str, MetadataFilter]:
+    """Separate filter tokens (from:, to:, title:, podcast:) from the text query.
+
+    Example: `klima from:2025-01-01 title:"live"` -> ("klima", MetadataFilter(...))
+
+    Args:
+        query: query string as typed by the user
+
+    Returns:
+        tuple[str, MetadataFilter]: remaining text query and the filter
+
+    Raises:
+        ValueError: if a date is not in the format YYYY-MM-DD
+    """
+    values = {}
+    for match in FILTER_TOKEN_RE.finditer(query):
+        key, quoted_value, value = match.groups()
+        values[key] = quoted_value if quoted_value is not None else value
+
+    text = " ".join(FILTER_TOKEN_RE.sub(" ", query).split())
+    metadata_filter = MetadataFilter(
+        date_from=values.get("from"), date_to=values.get("to"), title=values.get("title"), podcast=values.get("podcast")
+    )
+    return text, metadata_filter
+
+
+def get_json_path(txt_path) -> Path:
+    """Return the path of the json file which belongs to a fulltext transcript (see download.py)."""
+    txt_path = Path(txt_path)
+    return txt_path.parent.parent / txt_path.with_suffix(".json").name
+
+
+class MetadataTable:
+    def __init__(self) -> None:
+        """Columnar metadata table (row i belongs to file id i)."""
+        self.publish_dates = array("I")  # proleptic ordinals, 0: unknown
+        self.titles = []
+        self.video_ids = []
+        self.podcasts = []
+
+    def __len__(self) -> int:
+        return len(self.publish_dates)
+
+    def append(self, txt_path) -> None:
+        """Add the metadata of one transcript (from its filename and the accompanying json file)."""
+        try:
+            data = load_json_file(get_json_path(txt_path))
+        except (json.JSONDecodeError, OSError):
+            data = {}
+
+        publish_date = data.get("publish_date") or get_publish_date(txt_path)
+        try:
+            self.publish_dates.append(_parse_date(publish_date))
+        except ValueError:
+            self.publish_dates.append(0)
+        self.titles.append(data.get("video_title") or "")
+        self.video_ids.append(data.get("video_id") or "")
+        self.podcasts.append(data.get("podcast") or PODCAST_NAME)
+
+    @classmethod
+    def from_files(cls, filepaths: list[str]) -> "MetadataTable":
+        table = cls()
+        for filepath in filepaths:
+            table.append(filepath)
+        return table
+
+    def get_publish_date(self, file_id: int) -> str | None:
+        ordinal = self.publish_dates[file_id]
+        if not ordinal:
+            return None
+        return datetime.date.fromordinal(ordinal).isoformat()
+
+    def select(self, metadata_filter: MetadataFilter) -> set[int]:
+        """Return the ids of all files which match the filter."""
+        file_ids = range(len(self))
+        if metadata_filter.date_from or metadata_filter.date_to:
+            date_from = metadata_filter.date_from or 1
+            date_to = metadata_filter.date_to or datetime.date.max.toordinal()
+            dates = self.publish_dates
+            file_ids = [i for i in file_ids if date_from <= dates[i] <= date_to]
+        if metadata_filter.title:
+            file_ids = [i for i in file_ids if metadata_filter.title in self.titles[i].lower()]
+        if metadata_filter.podcast:
+            file_ids = [i for i in file_ids if metadata_filter.podcast in self.podcasts[i].lower()]
+        return set(file_ids)
+
+    def to_dict(self) -> dict:
+        return {
+            "publish_dates": self.publish_dates.tobytes(),
+            "titles": self.titles,
+            "video_ids": self.video_ids,
+            "podcasts": self.podcasts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetadataTable":
+        table = cls()
+        table.publish_dates.frombytes(data["publish_dates"])
+        table.titles = data["titles"]
+        table.video_ids = data["video_ids"]
+        # indices built before the fallback contain empty podcast names
+        table.podcasts = [podcast or PODCAST_NAME for podcast in data["podcasts"]]
+        return table
@@ -0,0 +1,152 @@
+"""
+Opt-in profiling of live requests.
+
+A fraction of the requests (PROFILE_SAMPLE_RATE) and every request with the header
+`X-Hakitool-Profile: <PROFILE_TOKEN>` are executed under cProfile. The profile of each request
+is written to PROFILE_DIR together with a line in `requests.jsonl` (endpoint, path, duration).
+`hakitool profile-summary` aggregates the captured profiles.
+
+The settings are read from the flask config, e.g. via environment variables:
+
+    HAKITOOL_PROFILE_SAMPLE_RATE=0.01 HAKITOOL_PROFILE_TOKEN=secret uwsgi ...
+
+If neither a sample rate nor a token is configured the view functions are not wrapped at all,
+i.e. there is no overhead.
+"""
+
+import os
+import hmac
+import json
+import time
+import random
+import cProfile
+import functools
+import threading
+
+
+PROFILE_HEADER = "X-Hakitool-Profile"
+REQUEST_LOG_NAME = "requests.jsonl"
+
+
+class RequestProfiler:
+    def __init__(self, output_dir: str = "profiles", sample_rate: float = 0.0, token: str | None = None) -> None:
+        """Profile some requests of view functions and store the results.
+
+        Args:
+            output_dir: directory for the .prof files and the request log
+            sample_rate: fraction of requests which are profiled (0...1)
+            token: secret which enables profiling of a request via the header X-Hakitool-Profile
+        """
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.token = token
+
+        # cProfile can only profile one request at a time (requests are skipped while it is busy)
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    @classmethod
+    def from_config(cls, config) -> "RequestProfiler":
+        # (values from environment variables are json-decoded by flask, e.g. a numeric token)
+        token = config.get("PROFILE_TOKEN")
+        return cls(
+            output_dir=config.get("PROFILE_DIR", "profiles"),
+            sample_rate=float(config.get("PROFILE_SAMPLE_RATE") or 0.0),
+            token=str(token) if token else None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.token is not None
+
+    def should_profile(self, header_value: str | None) -> bool:
+        if header_value is not None and self.token is not None:
+            return hmac.compare_digest(header_value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profile(self, view_func):
+        """Decorator for flask view functions (returns view_func itself if profiling is disabled)."""
+        if not self.enabled:
+            return view_func
+
+        from flask import request
+
+        @functools.wraps(view_func)
+        def wrapper(*args, **kwargs):
+            if not self.should_profile(request.headers.get(PROFILE_HEADER)):
+                return view_func(*args, **kwargs)
+            if not self.lock.acquire(blocking=False):
+                return view_func(*args, **kwargs)
+            try:
+                profiler = cProfile.Profile()
+                start = time.perf_counter()
+                try:
+                    return profiler.runcall(view_func, *args, **kwargs)
+                finally:
+                    duration = time.perf_counter() - start
+                    self.save(profiler, view_func.__name__, request.full_path, request.values.get("search_term"), duration)
+            finally:
+                self.lock.release()
+
+        return wrapper
+
+    def save(self, profiler: cProfile.Profile, endpoint: str, path: str, search_term: str | None, duration: float) -> str:
+        """Write the profile of one request and append it to the request log; return the filename."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.counter += 1
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{self.counter}_{endpoint}.prof"
+        profiler.dump_stats(os.path.join(self.output_dir, filename))
+
+        record = {
+            "file": filename,
+            "endpoint": endpoint,
+            "path": path,
+            "search_term": search_term,
+            "duration_ms": round(duration * 1000, 1),
+        }
+        with open(os.path.join(self.output_dir, REQUEST_LOG_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return filename
+
+
+def load_request_log(output_dir: str) -> list[dict]:
+    """Return the records of all profiled requests whose profile file still exists."""
+    path = os.path.join(output_dir, REQUEST_LOG_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [record for record in records if os.path.exists(os.path.join(output_dir, record["file"]))]
+
+
+def summarize(output_dir: str, endpoint: str | None = None, top: int = 20, sort: str = "cumulative", stream=None) -> int:
+    """Print the hottest functions over all captured profiles and the slowest requests.
+
+    Args:
+        output_dir: directory of the captured profiles
+        endpoint: only use the profiles of this view function (e.g. "home" or "show_file")
+        top: number of functions and requests to show
+        sort: pstats sort key (e.g. "cumulative", "tottime", "ncalls")
+        stream: output stream (default: stdout)
+
+    Returns:
+        int: number of aggregated profiles
+    """
+    import pstats
+
+    records = load_request_log(output_dir)
+    if endpoint is not None:
+        records = [record for record in records if record["endpoint"] == endpoint]
+    if not records:
+        print(f"no profiles found in {output_dir}", file=stream)
+        return 0
+
+    stats = pstats.Stats(*(os.path.join(output_dir, record["file"]) for record in records), stream=stream)
+    print(f"{len(records)} profiled requests", file=stream)
+    print("\nslowest requests:", file=stream)
+    for record in sorted(records, key=lambda r: r["duration_ms"], reverse=True)[:top]:
+        print(f"{record['duration_ms']:>10.1f} ms  {record['endpoint']:<10} {record['path']}  {record['search_term'] or ''}", file=stream)
+
+    print(f"\nhottest functions (sorted by {sort}):", file=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return len(records)
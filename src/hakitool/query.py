@@ -0,0 +1,267 @@
+"""
+Boolean queries on the word index, e.g. `klima (wandel OR krise) -politik`.
+
+Syntax: words separated by whitespace (or `AND`) must all occur, `OR` combines alternatives,
+`NOT` or a leading `-` excludes a word or group, parentheses group. AND binds stronger than OR.
+The operators must be written in upper case; words are matched case insensitively (whole words).
+
+Boolean mode has to be requested explicitly (e.g. `hakitool search --boolean`), otherwise
+queries like `(Teil 2)` are searched as substrings.
+
+A query is evaluated only on the posting lists of the index: the planner intersects the
+shortest lists first (with galloping search if one list is much longer than the other) and
+stops as soon as an intermediate result is empty. Thus no transcript is opened to determine
+the matching files.
+"""
+
+import re
+import bisect
+
+OPERATORS = ("AND", "OR", "NOT")
+
+# tokens: parentheses, '-' at the start of a word (NOT), words; other characters separate words
+TOKEN_RE = re.compile(r"\(|\)|(?<!\w)-(?=[\w(])|\w+")
+
+# use galloping search if one posting list is at least this many times longer than the other
+GALLOP_RATIO = 8
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+class Term:
+    def __init__(self, word: str) -> None:
+        self.word = word.lower()
+
+    def __repr__(self) -> str:
+        return f"Term({self.word!r})"
+
+
+class And:
+    def __init__(self, children: list) -> None:
+        self.children = children
+
+    def __repr__(self) -> str:
+        return f"And({self.children!r})"
+
+
+class Or:
+    def __init__(self, children: list) -> None:
+        self.children = children
+
+    def __repr__(self) -> str:
+        return f"Or({self.children!r})"
+
+
+class Not:
+    def __init__(self, child) -> None:
+        self.child = child
+
+    def __repr__(self) -> str:
+        return f"Not({self.child!r})"
+
+
+def is_boolean_query(text: str) -> bool:
+    """Return True if text looks like a boolean query (operators, parentheses or `-word`).
+
+    This is only a hint (e.g. for the query mix of the load test): the search interprets a
+    query as boolean only if this is requested.
+    """
+    tokens = TOKEN_RE.findall(text)
+    has_syntax = any(token in OPERATORS or token in ("(", ")", "-") for token in tokens)
+    has_words = any(token not in ("(", ")", "-") for token in tokens)
+    return has_syntax and has_words
+
+
+def parse_boolean_query(text: str):
+    """Parse a boolean query into a tree of Term, And, Or and Not nodes.
+
+    Args:
+        text: query string (without metadata filters)
+
+    Returns:
+        root node of the query tree
+
+    Raises:
+        QuerySyntaxError: if the query is empty or malformed (e.g. unbalanced parentheses)
+    """
+    parser = _Parser(TOKEN_RE.findall(text))
+    node = parser.parse_or()
+    if parser.peek() is not None:
+        raise QuerySyntaxError(f"unexpected '{parser.peek()}' in query: {text}")
+    return node
+
+
+class _Parser:
+    """Recursive descent parser (or_expr := and_expr (OR and_expr)*, and_expr := unary ([AND] unary)*)."""
+
+    def __init__(self, tokens: list[str]) -> None:
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> str | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self) -> str | None:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.next()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_unary()]
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.next()
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_unary(self):
+        token = self.next()
+        if token in ("NOT", "-"):
+            return Not(self.parse_unary())
+        if token == "(":
+            node = self.parse_or()
+            if self.next() != ")":
+                raise QuerySyntaxError("missing ')' in query")
+            return node
+        if token is None or token in OPERATORS or token == ")":
+            raise QuerySyntaxError(f"expected a word but got {token or 'end of query'!r}")
+        return Term(token)
+
+
+def positive_words(node) -> list[str]:
+    """Return the words of a query tree which are not negated (e.g. for highlighting)."""
+    if isinstance(node, Term):
+        return [node.word]
+    if isinstance(node, Not):
+        return []
+    return [word for child in node.children for word in positive_words(child)]
+
+
+def matches_words(node, words: set[str]) -> bool:
+    """Evaluate a query tree on the set of (lowercase) words of a single file."""
+    if isinstance(node, Term):
+        return node.word in words
+    if isinstance(node, Not):
+        return not matches_words(node.child, words)
+    if isinstance(node, Or):
+        return any(matches_words(child, words) for child in node.children)
+    return all(matches_words(child, words) for child in node.children)
+
+
+def _gallop(postings: list[int], value: int, lo: int) -> int:
+    """Return the first index >= lo with postings[index] >= value (exponential + binary search)."""
+    n = len(postings)
+    bound = 1
+    while lo + bound < n and postings[lo + bound] < value:
+        bound *= 2
+    return bisect.bisect_left(postings, value, lo, min(lo + bound + 1, n))
+
+
+def intersect_sorted(a: list[int], b: list[int]) -> list[int]:
+    """Intersect two sorted lists of file ids.
+
+    If one list is much longer, the elements of the short list are searched in the long list
+    with galloping search (costs O(m log(n/m)) instead of O(n + m)).
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return []
+    if len(b) < GALLOP_RATIO * len(a):
+        b_set = set(b)
+        return [file_id for file_id in a if file_id in b_set]
+
+    res = []
+    lo = 0
+    for file_id in a:
+        lo = _gallop(b, file_id, lo)
+        if lo == len(b):
+            break
+        if b[lo] == file_id:
+            res.append(file_id)
+    return res
+
+
+def difference_sorted(a: list[int], b: list[int]) -> list[int]:
+    """Return the elements of the sorted list a which are not in the sorted list b."""
+    if not a or not b:
+        return list(a)
+    if len(b) < GALLOP_RATIO * len(a):
+        b_set = set(b)
+        return [file_id for file_id in a if file_id not in b_set]
+
+    res = []
+    lo = 0
+    for file_id in a:
+        lo = _gallop(b, file_id, lo)
+        if lo == len(b) or b[lo] != file_id:
+            res.append(file_id)
+    return res
+
+
+class QueryPlanner:
+    def __init__(self, index: dict[str, list[int]], n_files: int) -> None:
+        """Evaluate query trees on posting lists.
+
+        Args:
+            index: word -> sorted list of file ids
+            n_files: total number of files (needed to evaluate pure negations)
+        """
+        self.index = index
+        self.n_files = n_files
+
+    def cost(self, node) -> int:
+        """Estimate (an upper bound of) the number of file ids a node evaluates to."""
+        if isinstance(node, Term):
+            return len(self.index.get(node.word, ()))
+        if isinstance(node, Not):
+            return self.n_files - self.cost(node.child)
+        if isinstance(node, Or):
+            return min(self.n_files, sum(self.cost(child) for child in node.children))
+        positive = [self.cost(child) for child in node.children if not isinstance(child, Not)]
+        return min(positive, default=self.n_files)
+
+    def evaluate(self, node) -> list[int]:
+        """Return the sorted ids of the files which match the query tree."""
+        if isinstance(node, Term):
+            return self.index.get(node.word, [])
+        if isinstance(node, Not):
+            return difference_sorted(range(self.n_files), self.evaluate(node.child))
+        if isinstance(node, Or):
+            file_ids = set()
+            for child in node.children:
+                file_ids.update(self.evaluate(child))
+            return sorted(file_ids)
+        return self._evaluate_and(node)
+
+    def _evaluate_and(self, node) -> list[int]:
+        positive = sorted((child for child in node.children if not isinstance(child, Not)), key=self.cost)
+        # the negations which exclude the most files first
+        negative = sorted(
+            (child.child for child in node.children if isinstance(child, Not)), key=self.cost, reverse=True
+        )
+
+        if positive:
+            # cheapest first: the intermediate result never grows
+            res = self.evaluate(positive[0])
+            for child in positive[1:]:
+                if not res:
+                    return []
+                res = intersect_sorted(res, self.evaluate(child))
+        else:
+            res = range(self.n_files)
+
+        for child in negative:
+            if not res:
+                return []
+            res = difference_sorted(res, self.evaluate(child))
+        return list(res)
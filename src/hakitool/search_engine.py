@@ -1,67 +1,322 @@
 import os
 import re
+import sys
 import pickle
+import logging
+import bisect
+import itertools
+import collections
+import functools
 from pathlib import Path
 
-from ipydex import IPS
+from .metadata import MetadataTable, parse_query
+from .transcript_store import STORE_SUFFIX, read_transcript_lines
+from .index_build import INDEX_VERSION, WORD, WORD_COUNT, WORD_RE, DEFAULT_MEMORY_BUDGET_MB, IndexBuilder, iter_pickled_chunks
+from .timeline import aggregate_counts
+from .query import QueryPlanner, intersect_sorted, matches_words, parse_boolean_query, positive_words
+
+# messages of the search itself (which runs on the request path of the web app)
+logger = logging.getLogger("hakitool.search")
+
+# default number of context windows (snippets) shown per file
+DEFAULT_MAX_SNIPPETS = 5
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the set of all trigrams (substrings of length 3) of every line in text.
+
+    Args:
+        text: (lowercase) text to split into trigrams
+
+    Returns:
+        set[str]: trigrams which occur in text (never spanning a line break)
+    """
+    res = set()
+    for line in text.split("\n"):
+        res.update(line[i:i + 3] for i in range(len(line) - 2))
+    return res
+
+
+def required_literals(pattern: str) -> list[str]:
+    """Extract literal strings which every match of a regex pattern must contain.
+
+    This is conservative: alternations, optional parts and character classes
+    contribute nothing. Thus the result might be empty (e.g. for `a|b`).
+
+    The pattern is analyzed with the private parser of the re module. If it is not available
+    (or works differently in another python version) the result is empty, i.e. all files are
+    searched.
+
+    Args:
+        pattern: regular expression
+
+    Returns:
+        list[str]: non-empty literal substrings of each possible match
+    """
+    try:
+        from re import _parser as re_parser, _constants as re_constants
+
+        literals = []
+        _collect_literals(re_parser.parse(pattern), literals, re_constants)
+    except Exception:
+        return []
+    return [lit for lit in literals if lit]
+
+
+def _collect_literals(items, literals: list[str], re_constants) -> None:
+    current = []
+    for op, arg in items:
+        if op is re_constants.LITERAL:
+            current.append(chr(arg))
+            continue
+        literals.append("".join(current))
+        current = []
+        if op is re_constants.SUBPATTERN:
+            _collect_literals(arg[-1], literals, re_constants)
+        elif op in (re_constants.MAX_REPEAT, re_constants.MIN_REPEAT) and arg[0] >= 1:
+            # the repeated part must occur at least once
+            _collect_literals(arg[2], literals, re_constants)
+    literals.append("".join(current))
+
+
+def intersect_postings(postings: list[list[int]]) -> list[int]:
+    """Intersect sorted posting lists (shortest first to keep intermediate results small).
+
+    Args:
+        postings: list of sorted lists of file ids
+
+    Returns:
+        list[int]: sorted list of file ids contained in every posting list
+    """
+    if not postings:
+        return []
+    postings = sorted(postings, key=len)
+    res = postings[0]
+    for other in postings[1:]:
+        if not res:
+            break
+        res = intersect_sorted(res, other)
+    return res
+
+
+def merge_windows(match_lines: list[int], n_lines: int, context_lines: int) -> list[tuple[int, int, list[int]]]:
+    """Merge the context windows of matching lines if they overlap or touch.
+
+    A merged window grows to at most three times the size of a single window, then a new
+    window is started (to avoid huge snippets for long runs of matching lines). The new window
+    continues at the end of the previous one, thus no line is shown twice.
+
+    Args:
+        match_lines: sorted (0-based) indices of matching lines
+        n_lines: number of lines in the file
+        context_lines: number of lines to show around each match
+
+    Returns:
+        list[tuple[int, int, list[int]]]: (start, end, match_lines) of every window (end exclusive)
+    """
+    max_window_lines = 3 * (2 * context_lines + 1)
+    windows = []
+    for i in match_lines:
+        start = max(0, i - context_lines)
+        end = min(n_lines, i + context_lines + 1)
+        if windows and start <= windows[-1][1]:
+            last = windows[-1]
+            if end - last[0] <= max_window_lines:
+                last[1] = end
+                last[2].append(i)
+            elif i < last[1]:
+                # the matching line is already part of the full window (only its trailing context is cut)
+                last[2].append(i)
+            else:
+                windows.append([last[1], end, [i]])
+        else:
+            windows.append([start, end, [i]])
+    return [tuple(window) for window in windows]
+
+
+def select_windows(windows: list, max_snippets: int | None) -> list:
+    """Keep the max_snippets windows with the most matches (in document order)."""
+    if max_snippets is None or len(windows) <= max_snippets:
+        return windows
+    # sort by number of matches (descending); ties: earlier window first
+    best = sorted(range(len(windows)), key=lambda k: (-len(windows[k][2]), k))[:max_snippets]
+    return [windows[k] for k in sorted(best)]
+
+
+def rank_key(result: tuple) -> tuple:
+    """Sort key of search results: most matching lines first, ties by filename."""
+    filename, _, n_matches = result
+    return -n_matches, filename
+
+
+def _find_all(haystack: str, needle: str):
+    """Yield the start positions of all occurrences of needle in haystack."""
+    pos = haystack.find(needle)
+    while pos != -1:
+        yield pos
+        pos = haystack.find(needle, pos + 1)
+
 
 class TextFileIndexer:
-    def __init__(self, directory: str) -> None:
+    def __init__(self, directory: str, index_file: str = "file_index.pkl", file_filter=None) -> None:
         """Initialize the TextFileIndexer with a directory to search.
 
         Args:
             directory: Path to the directory containing text files to index
+            index_file: Path of the pickle file which stores the index
+            file_filter: optional callable (Path -> bool) to restrict the indexer
+                to a subset of the text files (e.g. one shard)
         """
         self.directory = directory
-        self.index_file = "file_index.pkl"
+        self.index_file = index_file
+        self.file_filter = file_filter
+
+        # list of indexed filepaths; the position in this list is the file id
+        self.files = []
+
+        # word -> sorted list of file ids
         self.index = {}
 
-    def build_index(self) -> None:
+        # word -> number of occurrences in each file of self.index[word]
+        self.word_counts = {}
+
+        # trigram -> sorted list of file ids (allows narrowing of substring and regex queries)
+        self.trigram_index = {}
+
+        # publish date, title etc. for every file id
+        self.metadata = MetadataTable()
+
+        # indexed filepath -> filepaths of near-duplicates which are not indexed (see dedup.py)
+        self.aliases = {}
+
+    def build_index(
+        self, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, load: bool = True, dedup_threshold: float | None = None
+    ) -> None:
         """Build an index of all words in all text files.
 
-        Creates an inverted index mapping words to files containing them.
+        Creates an inverted index mapping words to files containing them
+        (with the number of occurrences per file), a trigram index mapping every trigram to the files containing it
+        and a table with the metadata of every file.
         The index is saved to disk as a pickle file for future use.
 
+        The postings are collected in sorted runs on disk which are merged at the end
+        (see index_build.py), thus the memory usage is bounded by memory_budget_mb.
+
+        If dedup_threshold is given, near-duplicates (re-uploads etc.) of an already indexed
+        file are not indexed but stored as its aliases.
+
+        Args:
+            memory_budget_mb: approximate memory for buffered postings
+            load: Whether to load the finished index into memory
+            dedup_threshold: minimum similarity (0...1, e.g. 0.8) of near-duplicates (None: keep all files)
+
         Returns:
             None
         """
         print("Building index... (This may take a while for many files)")
-        self.index = {}
 
-        txt_files = list(Path(self.directory).glob("*.txt"))
+        txt_files = self.get_txt_files()
         total_files = len(txt_files)
 
-        for i, filepath in enumerate(txt_files, 1):
-            if i % 100 == 0 or i == total_files:
-                print(f"Indexing... {i}/{total_files} files processed", end='\r')
+        builder = IndexBuilder(self.index_file, memory_budget_mb, dedup_threshold)
+        try:
+            for i, filepath in enumerate(txt_files, 1):
+                if i % 100 == 0 or i == total_files:
+                    print(f"Indexing... {i}/{total_files} files processed", end='\r')
 
-            try:
-                with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read().lower()
-                    words = set(re.findall(r'\w+', content))
-                    for word in words:
-                        if word not in self.index:
-                            self.index[word] = []
-                        self.index[word].append(str(filepath))
-            except Exception as e:
-                print(f"\nError processing {filepath}: {e}")
+                try:
+                    builder.add_file(filepath)
+                except Exception as e:
+                    print(f"\nError processing {filepath}: {e}")
 
-        # Save index to file
-        with open(self.index_file, 'wb') as f:
-            pickle.dump(self.index, f)
+            metadata = MetadataTable.from_files(builder.files)
+            header = {
+                "index_version": INDEX_VERSION,
+                "files": builder.files,
+                "metadata": metadata.to_dict(),
+                "aliases": builder.aliases,
+            }
+            builder.finish(header)
+        finally:
+            builder.cleanup()
         print("\nIndex built and saved successfully.")
+        if builder.aliases:
+            n_duplicates = sum(map(len, builder.aliases.values()))
+            print(f"{n_duplicates} near-duplicates of {len(builder.aliases)} files were not indexed.")
+
+        if load:
+            self.load_index()
+
+    def get_txt_files(self) -> list[Path]:
+        """Return the (sorted) paths of all text files this indexer is responsible for.
+
+        Transcripts which are only available in compressed form (`x.txt.hkz`, see
+        transcript_store.py) are included with their plain text path (`x.txt`).
+        """
+        directory = Path(self.directory)
+        compressed_files = (path.with_name(path.name[:-len(STORE_SUFFIX)]) for path in directory.glob("*.txt.hkz"))
+        txt_files = sorted(set(directory.glob("*.txt")).union(compressed_files))
+        if self.file_filter is not None:
+            txt_files = [filepath for filepath in txt_files if self.file_filter(filepath)]
+        return txt_files
 
     def load_index(self) -> bool:
         """Load existing index from file.
 
+        The index is loaded completely before it replaces the attributes, thus concurrent
+        searches see either the old or the new index (never a partially loaded one).
+
         Returns:
             bool: True if index was loaded successfully, False otherwise
         """
-        if os.path.exists(self.index_file):
-            with open(self.index_file, 'rb') as f:
-                self.index = pickle.load(f)
-            return True
-        return False
+        if not os.path.exists(self.index_file):
+            return False
+
+        with open(self.index_file, 'rb') as f:
+            header = pickle.load(f)
+
+            if "index_version" not in header:
+                # legacy format: plain dict word -> list of filepaths (no trigrams)
+                files = sorted(set(itertools.chain.from_iterable(header.values())))
+                file_ids = {filepath: file_id for file_id, filepath in enumerate(files)}
+                index = {
+                    word: sorted(file_ids[filepath] for filepath in filepaths) for word, filepaths in header.items()
+                }
+                self._set_index(files, index, {}, {}, MetadataTable.from_files(files), {})
+                return True
+
+            if header["index_version"] != INDEX_VERSION:
+                logger.warning("Index in %s is outdated and has to be rebuilt.", self.index_file)
+                return False
+
+            index = {}
+            trigram_index = {}
+            word_counts = {}
+            for kind, term, postings in iter_pickled_chunks(f):
+                if kind == WORD:
+                    index[term] = postings
+                elif kind == WORD_COUNT:
+                    word_counts[term] = postings
+                else:
+                    trigram_index[term] = postings
+        self._set_index(
+            header["files"],
+            index,
+            trigram_index,
+            word_counts,
+            MetadataTable.from_dict(header["metadata"]),
+            header.get("aliases", {}),
+        )
+        return True
+
+    def _set_index(self, files, index, trigram_index, word_counts, metadata, aliases) -> None:
+        # the index is assigned last: code which checks `indexer.index` finds the other parts complete
+        self.files = files
+        self.trigram_index = trigram_index
+        self.word_counts = word_counts
+        self.metadata = metadata
+        self.aliases = aliases
+        self.index = index
 
     def search_in_index(self, search_term: str) -> list[str]:
         """Search for term in the pre-built index.
@@ -74,59 +329,348 @@ class TextFileIndexer:
         """
         search_term = search_term.lower()
         if search_term in self.index:
-            return self.index[search_term]
+            return [self.files[file_id] for file_id in self.index[search_term]]
         return []
 
-    def search_in_files(self, search_term: str, context_lines: int = 3) -> list[tuple[str, list[str]]]:
+    def search_boolean(self, query: str) -> list[str]:
+        """Determine the files matching a boolean query using only the word index (see query.py).
+
+        Without a loaded index the query is evaluated on the words of every file.
+
+        Args:
+            query: e.g. `klima (wandel OR krise) -politik`
+
+        Returns:
+            list[str]: List of filepaths which match the query
+
+        Raises:
+            QuerySyntaxError: if the query is malformed
+        """
+        node = parse_boolean_query(query)
+        if not self.index:
+            logger.info("No index loaded. Evaluating %r on all files...", query)
+            return [filepath for filepath in self._get_all_files() if matches_words(node, self._get_file_words(filepath))]
+        file_ids = QueryPlanner(self.index, len(self.files)).evaluate(node)
+        return [self.files[file_id] for file_id in file_ids]
+
+    @staticmethod
+    def _get_file_words(filepath) -> set[str]:
+        try:
+            return set(WORD_RE.findall("".join(read_transcript_lines(filepath)).lower()))
+        except Exception as e:
+            logger.warning("Error searching %s: %s", filepath, e)
+            return set()
+
+    def get_term_timeline(self, term: str, bucket: str = "month", metadata_filter=None) -> list[dict]:
+        """Count the occurrences of a word per week or month (from the counts stored in the index).
+
+        Args:
+            term: single word (case insensitive)
+            bucket: "week" or "month"
+            metadata_filter: optional MetadataFilter to restrict the counted episodes
+
+        Returns:
+            list[dict]: {'period', 'count', 'episodes'} in chronological order
+                (episodes without publish date are not counted)
+
+        Raises:
+            ValueError: if term is not a single word or the bucket is unknown
+        """
+        term = term.strip().lower()
+        if not WORD_RE.fullmatch(term):
+            raise ValueError(f"the timeline needs a single word, got: {term!r}")
+        if self.index and not self.word_counts:
+            logger.warning("Index in %s contains no word counts and has to be rebuilt.", self.index_file)
+
+        file_ids = self.index.get(term, [])
+        counts = self.word_counts.get(term, [])
+        dates = self.metadata.publish_dates
+        selected = None
+        if metadata_filter is not None and not metadata_filter.is_empty():
+            selected = self.metadata.select(metadata_filter)
+        dated_counts = (
+            (dates[file_id], count)
+            for file_id, count in zip(file_ids, counts)
+            if dates[file_id] and (selected is None or file_id in selected)
+        )
+        return aggregate_counts(dated_counts, bucket)
+
+    def search_in_trigram_index(self, literals: list[str]) -> list[str] | None:
+        """Determine the files which might contain all of the given literal strings.
+
+        Args:
+            literals: substrings which must occur in a matching file
+
+        Returns:
+            list[str] | None: List of candidate filepaths (superset of the files with a match)
+                or None if the literals are too short to narrow down the search
+        """
+        grams = set()
+        for literal in literals:
+            grams.update(trigrams(literal.lower()))
+        if not grams:
+            return None
+        file_ids = intersect_postings([self.trigram_index.get(gram, []) for gram in grams])
+        return [self.files[file_id] for file_id in file_ids]
+
+    def _get_candidate_files(self, search_term: str, literals: list[str], regex: bool) -> list[str]:
+        if self.trigram_index:
+            possible_files = self.search_in_trigram_index(literals)
+            if possible_files is not None:
+                return possible_files
+        elif not regex:
+            # no trigram index (legacy index file): only whole words can be looked up
+            possible_files = self.search_in_index(search_term)
+            if possible_files:
+                return possible_files
+
+        logger.info("Index can not narrow down %r. Performing full search...", search_term)
+        return self._get_all_files()
+
+    def _get_all_files(self) -> list[str]:
+        """Return all transcripts except the near-duplicates of indexed ones."""
+        alias_files = set(itertools.chain.from_iterable(self.aliases.values()))
+        return [str(f) for f in self.get_txt_files() if str(f) not in alias_files]
+
+    def search_in_files(
+        self,
+        search_term: str,
+        context_lines: int = 3,
+        regex: bool = False,
+        cancel_event=None,
+        metadata_filter=None,
+        max_snippets: int | None = DEFAULT_MAX_SNIPPETS,
+        boolean: bool = False,
+        top_k: int | None = None,
+    ) -> list[tuple[str, list[dict], int]]:
         """Search for term in files, showing surrounding context.
 
+        The trigram index narrows down the candidate files. Inside these files only the
+        lines containing the longest required literal are checked against the pattern.
+
+        Boolean queries (e.g. `klima OR wetter -politik`, see query.py) are
+        evaluated on the word index; the files are then only opened to collect the lines
+        which contain one of the (not negated) words.
+
+        Overlapping context windows are merged. Per file only the max_snippets windows
+        with the most matches are returned.
+
         Args:
-            search_term: Text string to search for
+            search_term: Text string (or regular expression if regex is True) to search for
             context_lines: Number of lines to show around each match
+            regex: Whether to interpret search_term as regular expression
+            cancel_event: optional threading.Event; if it is set the search stops early
+                (and returns the results found so far)
+            metadata_filter: optional MetadataFilter; files with other metadata are not opened
+            max_snippets: maximum number of context windows per file (None: unlimited)
+            boolean: Whether to interpret search_term as boolean query (whole words)
+            top_k: only return the top_k files with the most matching lines (default: all files)
 
         Returns:
-            list[tuple[str, list[str]]]: List of tuples containing:
+            list[tuple[str, list[dict], int]]: List of tuples (sorted by filename or, if top_k
+            is given, by the number of matches) containing:
                 - filename (str)
-                - list of matched contexts (list[str])
+                - list of contexts (dicts with the keys 'text', 'start_line' and
+                  'match_lines'; line numbers are 1-based)
+                - total number of matching lines in the file (int)
         """
-        # First try to use the index
-        possible_files = self.search_in_index(search_term)
-        if not possible_files:
-            print(f"No files in index contain '{search_term}'. Performing full search...")
-            possible_files = [str(f) for f in Path(self.directory).glob("*.txt")]
+        if boolean and regex:
+            raise ValueError("a query can not be both boolean and a regular expression")
+        if boolean:
+            # highlight the lines which contain one of the words (NOT-only queries highlight nothing)
+            words = positive_words(parse_boolean_query(search_term))
+            search_re = re.compile(r"\b(?:" + "|".join(map(re.escape, words)) + r")\b", re.IGNORECASE) if words else None
+            literals = []
+            possible_files = self.search_boolean(search_term)
+        else:
+            if regex:
+                search_re = re.compile(search_term, re.IGNORECASE)
+                literals = required_literals(search_term)
+            else:
+                search_re = re.compile(re.escape(search_term), re.IGNORECASE)
+                literals = [search_term]
 
-        results = []
-        search_re = re.compile(re.escape(search_term), re.IGNORECASE)
+            # First try to use the index
+            possible_files = self._get_candidate_files(search_term, literals, regex)
 
+        if metadata_filter is not None and not metadata_filter.is_empty():
+            # files which are not in the index have no metadata and are thus excluded
+            allowed_files = {self.files[file_id] for file_id in self.metadata.select(metadata_filter)}
+            possible_files = [filepath for filepath in possible_files if filepath in allowed_files]
+
+        # the longest literal is the most selective one to prefilter lines
+        needle = max(literals, key=len, default="").lower()
+        if "\n" in needle:
+            needle = ""
+
+        results = []
         for filepath in possible_files:
+            if cancel_event is not None and cancel_event.is_set():
+                break
             try:
-                with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    file_matches = []
-                    for i, line in enumerate(lines):
-                        if search_re.search(line):
-                            # Get context lines with start line info
-                            start = max(0, i - context_lines)
-                            end = min(len(lines), i + context_lines + 1)
-                            context = {
-                                'text': ''.join(lines[start:end]),
-                                'start_line': start + 1  # convert to 1-based index
-                            }
-                            file_matches.append(context)
-
-                    if file_matches:
-                        results.append((filepath, file_matches))
+                lines = read_transcript_lines(filepath)
+                match_lines = []
+                if search_re is not None:
+                    match_lines = [i for i in self._get_candidate_lines(lines, needle) if search_re.search(lines[i])]
+                if not match_lines and not boolean:
+                    continue
+
+                windows = merge_windows(match_lines, len(lines), context_lines)
+                contexts = [
+                    {
+                        'text': ''.join(lines[start:end]),
+                        'start_line': start + 1,  # convert to 1-based index
+                        'match_lines': [i + 1 for i in window_matches],
+                    }
+                    for start, end, window_matches in select_windows(windows, max_snippets)
+                ]
+                results.append((filepath, contexts, len(match_lines)))
             except Exception as e:
-                print(f"Error searching {filepath}: {e}")
+                logger.warning("Error searching %s: %s", filepath, e)
 
+        if top_k is not None:
+            return sorted(results, key=rank_key)[:top_k]
         results.sort(key=lambda x: x[0])  # Sort by filename
         return results
 
+    @staticmethod
+    def _get_candidate_lines(lines: list[str], needle: str):
+        """Return the indices of those lines which contain needle (case insensitive)."""
+        if not needle or not lines:
+            return range(len(lines))
+
+        line_ends = list(itertools.accumulate(len(line) for line in lines))
+        lowered = "".join(lines).lower()
+        if len(lowered) != line_ends[-1]:
+            # lower() changed the length (rare special characters): offsets are not reliable
+            return range(len(lines))
+
+        candidate_lines = []
+        for pos in _find_all(lowered, needle):
+            i = bisect.bisect_right(line_ends, pos)
+            if not candidate_lines or candidate_lines[-1] != i:
+                candidate_lines.append(i)
+        return candidate_lines
+
+
+def run_query(
+    indexer: TextFileIndexer,
+    query: str,
+    regex: bool = False,
+    context_lines: int = 3,
+    max_snippets: int | None = DEFAULT_MAX_SNIPPETS,
+    boolean: bool = False,
+    top_k: int | None = None,
+) -> dict:
+    """Run a single query (which may contain metadata filters) and return a json-serializable record.
+
+    Args:
+        indexer: TextFileIndexer with loaded index (or a started sharding.ShardedIndex)
+        query: query string (see metadata.parse_query)
+        regex: Whether to interpret the text query as regular expression
+        context_lines: Number of lines to show around each match
+        max_snippets: maximum number of context windows per file (None: unlimited)
+        boolean: Whether to interpret the text query as boolean query (see query.py)
+        top_k: only return the top_k files with the most matching lines (None: all files)
+
+    Returns:
+        dict: record with the keys "query" and "results" (or "error")
+    """
+    try:
+        text, metadata_filter = parse_query(query)
+        if not text:
+            raise ValueError("empty text query")
+        results = indexer.search_in_files(
+            text,
+            context_lines=context_lines,
+            regex=regex,
+            metadata_filter=metadata_filter,
+            max_snippets=max_snippets,
+            boolean=boolean,
+            top_k=top_k,
+        )
+    except (ValueError, re.error) as e:
+        return {"query": query, "error": str(e)}
+
+    return {
+        "query": query,
+        "n_files": len(results),
+        "results": [
+            {
+                "filename": filename,
+                "aliases": indexer.aliases.get(filename, []),
+                "n_matches": n_matches,
+                "contexts": contexts,
+            }
+            for filename, contexts, n_matches in results
+        ],
+    }
+
+
+# the index of a batch worker process (see search_batch)
+_worker_indexer = None
+
+# maximum number of queries per worker process which are submitted but not yet yielded
+BATCH_WINDOW_PER_JOB = 4
+
+
+def _init_batch_worker(directory: str, index_file: str) -> None:
+    global _worker_indexer
+
+    # diagnostic output of workers must not mix with the results
+    sys.stdout = sys.stderr
+    _worker_indexer = TextFileIndexer(directory, index_file)
+    _worker_indexer.load_index()
+
+
+def _run_worker_query(query: str, **kwargs) -> dict:
+    return run_query(_worker_indexer, query, **kwargs)
+
+
+def search_batch(indexer: TextFileIndexer, queries, jobs: int = 1, **kwargs):
+    """Run many queries against one index and yield one record per query (in order).
+
+    With several worker processes at most BATCH_WINDOW_PER_JOB * jobs queries are in flight, i.e.
+    the queries are read lazily and the results are streamed while later queries still run.
+
+    Args:
+        indexer: TextFileIndexer with loaded index (or a started sharding.ShardedIndex if jobs is 1)
+        queries: iterable of query strings
+        jobs: number of worker processes (each loads the index file once)
+        **kwargs: passed to run_query (regex, context_lines, max_snippets, boolean, top_k)
+
+    Yields:
+        dict: record as returned by run_query
+    """
+    if jobs <= 1:
+        for query in queries:
+            yield run_query(indexer, query, **kwargs)
+        return
+
+    # multiprocessing is only imported if needed (fast start of the cli)
+    from concurrent.futures import ProcessPoolExecutor
+
+    worker_func = functools.partial(_run_worker_query, **kwargs)
+    window = BATCH_WINDOW_PER_JOB * jobs
+    in_flight = collections.deque()
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_batch_worker, initargs=(indexer.directory, indexer.index_file)
+    ) as executor:
+        for query in queries:
+            in_flight.append(executor.submit(worker_func, query))
+            # yield the finished results at the head without waiting (keeps the order)
+            while in_flight and (len(in_flight) >= window or in_flight[0].done()):
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
 def main() -> None:
     """Command line interface for the text search engine.
 
     Allows interactive searching through text files in a directory.
-    Handles building and loading search indexes.
+    Handles building and loading search indexes. Queries may contain
+    metadata filters like `from:2025-01-01 to:2025-03-31 title:live`.
     """
     # directory = input("Enter the directory containing text files (default: current directory): ") or "."
     directory = "output/fulltext"
@@ -148,16 +692,22 @@ def main() -> None:
         if not search_term:
             continue
 
-        results = indexer.search_in_files(search_term)
+        try:
+            text, metadata_filter = parse_query(search_term)
+            results = indexer.search_in_files(text, metadata_filter=metadata_filter)
+        except ValueError as e:
+            print(f"Invalid query: {e}")
+            continue
 
         if not results:
             print(f"No matches found for '{search_term}'")
             continue
 
         print(f"\nFound {len(results)} files containing '{search_term}':")
-        for i, (filename, context) in enumerate(results, 1):
-            print(f"\n{'='*50}\nMatch {i}: {filename}\n{'='*50}")
-            print(context)
+        for i, (filename, contexts, n_matches) in enumerate(results, 1):
+            print(f"\n{'='*50}\nMatch {i}: {filename} ({n_matches} matching lines)\n{'='*50}")
+            for context in contexts:
+                print(f"--- line {context['start_line']}\n{context['text']}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,301 @@
+"""
+Split the index into independently rebuildable shards (by publish date range or by filename
+hash). Each shard is served by its own worker process; queries are fanned out to all workers
+in parallel and the results are merged.
+"""
+
+import os
+import json
+import zlib
+import bisect
+import heapq
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .search_engine import TextFileIndexer, DEFAULT_MAX_SNIPPETS, rank_key
+from .index_build import DEFAULT_MEMORY_BUDGET_MB
+from .timeline import merge_timelines
+from .util import get_publish_date
+
+
+MANIFEST_NAME = "manifest.json"
+
+# methods of TextFileIndexer which the coordinator may call in the worker processes
+WORKER_METHODS = ("load_index", "search_in_index", "search_in_files", "get_term_timeline")
+# attributes of TextFileIndexer which the coordinator may read from the worker processes
+WORKER_ATTRIBUTES = ("aliases",)
+
+
+class ShardLayout:
+    def __init__(self, strategy: str, n_shards: int, boundaries: list[str] | None = None) -> None:
+        """Describe how files are assigned to shards.
+
+        Args:
+            strategy: "date" (contiguous publish date ranges) or "hash" (crc32 of the filename)
+            n_shards: number of shards
+            boundaries: (only for strategy "date") sorted list of n_shards - 1 dates;
+                shard i contains the files with boundaries[i-1] <= date < boundaries[i]
+        """
+        if strategy not in ("date", "hash"):
+            raise ValueError(f"unknown shard strategy: {strategy}")
+        self.strategy = strategy
+        self.n_shards = n_shards
+        self.boundaries = boundaries or []
+
+    @classmethod
+    def from_files(cls, txt_files: list[Path], strategy: str, n_shards: int) -> "ShardLayout":
+        """Create a layout which distributes the given files evenly."""
+        boundaries = []
+        if strategy == "date":
+            dates = sorted(filter(None, map(get_publish_date, txt_files)))
+            if dates:
+                boundaries = [dates[len(dates) * i // n_shards] for i in range(1, n_shards)]
+        return cls(strategy, n_shards, boundaries)
+
+    def shard_of(self, filepath) -> int:
+        """Return the shard id of a file (files without date prefix belong to the first shard)."""
+        if self.strategy == "hash":
+            return zlib.crc32(os.path.basename(filepath).encode("utf-8")) % self.n_shards
+        publish_date = get_publish_date(filepath)
+        if publish_date is None:
+            return 0
+        return bisect.bisect_right(self.boundaries, publish_date)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump({"strategy": self.strategy, "n_shards": self.n_shards, "boundaries": self.boundaries}, fp)
+
+    @classmethod
+    def load(cls, path: str) -> "ShardLayout":
+        with open(path, encoding="utf-8") as fp:
+            return cls(**json.load(fp))
+
+
+class ShardFilter:
+    """Picklable file filter which selects the files of one shard."""
+
+    def __init__(self, layout: ShardLayout, shard_id: int) -> None:
+        self.layout = layout
+        self.shard_id = shard_id
+
+    def __call__(self, filepath) -> bool:
+        return self.layout.shard_of(filepath) == self.shard_id
+
+
+class ShardedIndex:
+    def __init__(
+        self, directory: str, shard_dir: str = "index_shards", n_shards: int | None = None, strategy: str | None = None
+    ):
+        """Manage a set of index shards and the worker processes which serve them.
+
+        The layout (i.e. the assignment of files to shards) is determined on the first build and
+        stored in the shard directory. Later builds reuse it such that every shard can be rebuilt
+        independently. To change the number of shards or the strategy delete the shard directory.
+
+        Args:
+            directory: Path to the directory containing text files to index
+            shard_dir: directory for the shard index files and the layout manifest
+            n_shards: number of shards (default: 4 or the number of the existing layout)
+            strategy: "date" or "hash" (default: "date" or the strategy of the existing layout)
+
+        Raises:
+            ValueError: if n_shards or strategy differ from the existing layout
+        """
+        self.directory = directory
+        self.shard_dir = shard_dir
+        self.manifest_path = os.path.join(shard_dir, MANIFEST_NAME)
+
+        if os.path.exists(self.manifest_path):
+            self.layout = ShardLayout.load(self.manifest_path)
+            if n_shards not in (None, self.layout.n_shards) or strategy not in (None, self.layout.strategy):
+                raise ValueError(
+                    f"the index in {shard_dir} has {self.layout.n_shards} shards by {self.layout.strategy} "
+                    "(delete the directory to change the layout)"
+                )
+        else:
+            txt_files = TextFileIndexer(directory).get_txt_files()
+            self.layout = ShardLayout.from_files(txt_files, strategy or "date", n_shards or 4)
+
+        self.workers = []
+        self.lock = threading.Lock()
+        # merged aliases of all shards (fetched from the workers when needed)
+        self._aliases = None
+
+    @property
+    def n_shards(self) -> int:
+        return self.layout.n_shards
+
+    def get_shard_indexer(self, shard_id: int) -> TextFileIndexer:
+        index_file = os.path.join(self.shard_dir, f"shard_{shard_id}.pkl")
+        return TextFileIndexer(self.directory, index_file, ShardFilter(self.layout, shard_id))
+
+    def build(
+        self,
+        shard_ids: list[int] | None = None,
+        memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+        dedup_threshold: float | None = None,
+    ) -> None:
+        """Build (or rebuild) the given shards (default: all) in parallel processes.
+
+        Running workers reload the rebuilt shards.
+
+        Args:
+            shard_ids: ids of the shards to build
+            memory_budget_mb: approximate memory budget of each build process
+            dedup_threshold: skip near-duplicates (only within each shard, see TextFileIndexer.build_index)
+
+        Raises:
+            ValueError: if a shard id does not belong to the layout
+        """
+        if shard_ids is None:
+            shard_ids = list(range(self.n_shards))
+        invalid_ids = [shard_id for shard_id in shard_ids if shard_id not in range(self.n_shards)]
+        if invalid_ids:
+            raise ValueError(f"invalid shard ids {invalid_ids} (the index has the shards 0...{self.n_shards - 1})")
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.layout.save(self.manifest_path)
+
+        indexers = [self.get_shard_indexer(shard_id) for shard_id in shard_ids]
+        with ProcessPoolExecutor(max_workers=len(indexers)) as executor:
+            # consume the iterator to propagate exceptions
+            list(executor.map(
+                _build_shard, indexers, itertools.repeat(memory_budget_mb), itertools.repeat(dedup_threshold)
+            ))
+
+        if self.workers:
+            for shard_id in shard_ids:
+                self._call(self.workers[shard_id], "load_index")
+            self._aliases = None
+
+    def start(self) -> None:
+        """Start one worker process per shard."""
+        if self.workers:
+            return
+        for shard_id in range(self.n_shards):
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve_shard, args=(worker_conn, self.get_shard_indexer(shard_id)), daemon=True
+            )
+            process.start()
+            self.workers.append((process, conn))
+
+    def stop(self) -> None:
+        for process, conn in self.workers:
+            conn.send(None)
+            process.join()
+        self.workers = []
+        self._aliases = None
+
+    def __enter__(self) -> "ShardedIndex":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def aliases(self) -> dict[str, list[str]]:
+        """Indexed filepath -> filepaths of its near-duplicates (of all shards, see TextFileIndexer.aliases)."""
+        if self._aliases is None:
+            aliases = {}
+            for shard_aliases in self._scatter_gather("aliases"):
+                aliases.update(shard_aliases)
+            self._aliases = aliases
+        return self._aliases
+
+    def search_in_files(
+        self,
+        search_term: str,
+        context_lines: int = 3,
+        regex: bool = False,
+        metadata_filter=None,
+        max_snippets: int | None = DEFAULT_MAX_SNIPPETS,
+        boolean: bool = False,
+        top_k: int | None = None,
+    ) -> list[tuple[str, list[dict], int]]:
+        """Search all shards in parallel (see TextFileIndexer.search_in_files).
+
+        Args:
+            search_term: Text string (or regular expression if regex is True) to search for
+            context_lines: Number of lines to show around each match
+            regex: Whether to interpret search_term as regular expression
+            metadata_filter: optional MetadataFilter
+            max_snippets: maximum number of context windows per file
+            boolean: Whether to interpret search_term as boolean query
+            top_k: only return the top_k files with the most matching lines (default: all files)
+
+        Returns:
+            list[tuple[str, list[dict], int]]: merged results of all shards, sorted by filename
+                (or by the number of matches if top_k is given)
+        """
+        shard_results = self._scatter_gather(
+            "search_in_files",
+            search_term,
+            context_lines,
+            regex=regex,
+            metadata_filter=metadata_filter,
+            max_snippets=max_snippets,
+            boolean=boolean,
+            top_k=top_k,
+        )
+        if top_k is None:
+            return list(heapq.merge(*shard_results, key=lambda x: x[0]))
+        # every shard returns its own top_k results (ranked)
+        return list(itertools.islice(heapq.merge(*shard_results, key=rank_key), top_k))
+
+    def get_term_timeline(self, term: str, bucket: str = "month", metadata_filter=None) -> list[dict]:
+        """Count the occurrences of a word per period in all shards (see TextFileIndexer.get_term_timeline)."""
+        shard_timelines = self._scatter_gather("get_term_timeline", term, bucket, metadata_filter=metadata_filter)
+        return merge_timelines(shard_timelines, bucket)
+
+    def _scatter_gather(self, method: str, *args, **kwargs) -> list:
+        if not self.workers:
+            raise RuntimeError("worker processes are not running (call start() first)")
+
+        # the pipes must not be used by several threads at the same time
+        with self.lock:
+            for _, conn in self.workers:
+                conn.send((method, args, kwargs))
+            responses = [conn.recv() for _, conn in self.workers]
+
+        for ok, result in responses:
+            if not ok:
+                raise result
+        return [result for _, result in responses]
+
+    def _call(self, worker, method: str, *args, **kwargs):
+        _, conn = worker
+        with self.lock:
+            conn.send((method, args, kwargs))
+            ok, result = conn.recv()
+        if not ok:
+            raise result
+        return result
+
+
+def _build_shard(indexer: TextFileIndexer, memory_budget_mb: float, dedup_threshold: float | None) -> None:
+    indexer.build_index(memory_budget_mb, load=False, dedup_threshold=dedup_threshold)
+
+
+def _serve_shard(conn, indexer: TextFileIndexer) -> None:
+    """Main loop of a worker process: answer requests until None is received."""
+    indexer.load_index()
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, args, kwargs = request
+        try:
+            if method in WORKER_ATTRIBUTES:
+                result = getattr(indexer, method)
+            elif method in WORKER_METHODS:
+                result = getattr(indexer, method)(*args, **kwargs)
+            else:
+                raise ValueError(f"unsupported method: {method}")
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, e))
+    conn.close()
@@ -0,0 +1,94 @@
+"""
+How often a word occurs over time. The counts are aggregated from the per-file word counts
+stored in the index and the publish dates of the metadata table, thus no transcript is opened.
+"""
+
+import datetime
+
+BUCKETS = ("week", "month")
+
+
+def bucket_key(ordinal: int, bucket: str) -> str:
+    """Return the label of the period which contains a date.
+
+    Args:
+        ordinal: proleptic ordinal of the date
+        bucket: "week" (ISO week, e.g. '2025-W07') or "month" (e.g. '2025-02')
+
+    Returns:
+        str: label of the period (labels of the same bucket type sort chronologically)
+    """
+    date = datetime.date.fromordinal(ordinal)
+    if bucket == "week":
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{date.year}-{date.month:02d}"
+
+
+def _next_period_start(ordinal: int, bucket: str) -> int:
+    date = datetime.date.fromordinal(ordinal)
+    if bucket == "week":
+        return ordinal - date.weekday() + 7
+    year, month = divmod(date.year * 12 + date.month, 12)
+    return datetime.date(year, month + 1, 1).toordinal()
+
+
+def aggregate_counts(dated_counts, bucket: str = "month") -> list[dict]:
+    """Sum up counts per period.
+
+    Periods between the first and the last occurrence without any occurrence are included
+    (with zero counts) such that the result can be plotted directly.
+
+    Args:
+        dated_counts: iterable of (date ordinal, count) pairs, one per episode
+        bucket: "week" or "month"
+
+    Returns:
+        list[dict]: {'period', 'count', 'episodes'} in chronological order
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"unknown bucket: {bucket} (use one of {', '.join(BUCKETS)})")
+
+    totals = {}
+    for ordinal, count in dated_counts:
+        period = _get_period(totals, bucket_key(ordinal, bucket))
+        period["count"] += count
+        period["episodes"] += 1
+    return _fill_gaps(totals, bucket)
+
+
+def merge_timelines(timelines: list[list[dict]], bucket: str = "month") -> list[dict]:
+    """Combine the timelines of several (sharded) indices into one."""
+    totals = {}
+    for timeline in timelines:
+        for period in timeline:
+            total = _get_period(totals, period["period"])
+            total["count"] += period["count"]
+            total["episodes"] += period["episodes"]
+    return _fill_gaps(totals, bucket)
+
+
+def _get_period(totals: dict, key: str) -> dict:
+    return totals.setdefault(key, {"period": key, "count": 0, "episodes": 0})
+
+
+def _fill_gaps(totals: dict, bucket: str) -> list[dict]:
+    """Return the periods from the first to the last key of totals in chronological order."""
+    if not totals:
+        return []
+    last = max(totals)
+    ordinal = _period_start(min(totals), bucket)
+    timeline = []
+    while (key := bucket_key(ordinal, bucket)) <= last:
+        timeline.append(_get_period(totals, key))
+        ordinal = _next_period_start(ordinal, bucket)
+    return timeline
+
+
+def _period_start(key: str, bucket: str) -> int:
+    """Return the ordinal of the first day of a period (inverse of bucket_key)."""
+    if bucket == "week":
+        year, week = key.split("-W")
+        return datetime.date.fromisocalendar(int(year), int(week), 1).toordinal()
+    year, month = key.split("-")
+    return datetime.date(int(year), int(month), 1).toordinal()
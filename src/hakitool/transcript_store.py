@@ -0,0 +1,218 @@
+"""
+Compressed storage of transcripts with block-level random access.
+
+A transcript `x.txt` can be stored as `x.txt.hkz` (in the same directory). The lines are split
+into blocks which are compressed independently (zstd if the package `zstandard` is installed,
+zlib otherwise). A block index at the end of the file allows to decompress only the blocks
+which contain the requested lines.
+
+File layout:
+
+    MAGIC | codec (1 byte) | block 0 | block 1 | ... | block index | trailer
+
+    block index: one entry (offset, compressed size, number of lines) per block
+    trailer: (offset of block index, number of blocks, MAGIC)
+
+All readers in this package use `read_transcript_lines` / `iter_transcript_lines`, which fall back
+to the plain text file if no compressed version exists.
+"""
+
+import os
+import gzip
+import json
+import zlib
+import struct
+import bisect
+import itertools
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC = b"HKZ1"
+STORE_SUFFIX = ".hkz"
+DEFAULT_BLOCK_LINES = 256
+
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+
+INDEX_ENTRY = struct.Struct("<QII")
+TRAILER = struct.Struct("<QI4s")
+
+
+def _compress(data: bytes, codec: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(data: bytes, codec: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("You need to install the package `zstandard` to read this transcript")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _split_lines(text: str) -> list[str]:
+    """Split text like file.readlines() does (only at '\\n', keeping it)."""
+    lines = [f"{line}\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def write_store_file(lines: list[str], path: str, block_lines: int = DEFAULT_BLOCK_LINES) -> None:
+    """Write lines (including their line breaks) to a compressed block file.
+
+    Args:
+        lines: lines of the transcript
+        path: target path (usually `<transcript>.txt.hkz`)
+        block_lines: number of lines per block
+    """
+    codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    block_index = []
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + codec)
+        for start in range(0, len(lines), block_lines):
+            block = lines[start:start + block_lines]
+            data = _compress("".join(block).encode("utf-8"), codec)
+            block_index.append((f.tell(), len(data), len(block)))
+            f.write(data)
+        index_offset = f.tell()
+        for entry in block_index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        f.write(TRAILER.pack(index_offset, len(block_index), MAGIC))
+    os.replace(tmp_path, path)
+
+
+class StoreFile:
+    def __init__(self, path: str) -> None:
+        """Open a compressed transcript and read its block index.
+
+        Args:
+            path: path of the `.hkz` file
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(len(MAGIC) + 1)
+            if header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a compressed transcript")
+            self.codec = header[len(MAGIC):]
+
+            f.seek(-TRAILER.size, os.SEEK_END)
+            index_offset, n_blocks, _ = TRAILER.unpack(f.read(TRAILER.size))
+            f.seek(index_offset)
+            self.block_index = [
+                INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size)) for _ in range(n_blocks)
+            ]
+
+        # first line number of every block (plus the total number of lines at the end)
+        self.block_starts = [0] + list(itertools.accumulate(n_lines for _, _, n_lines in self.block_index))
+
+    @property
+    def n_lines(self) -> int:
+        return self.block_starts[-1]
+
+    def read_block(self, f, block_id: int) -> list[str]:
+        offset, size, _ = self.block_index[block_id]
+        f.seek(offset)
+        return _split_lines(_decompress(f.read(size), self.codec).decode("utf-8"))
+
+    def iter_blocks(self, first_block: int = 0, last_block: int | None = None):
+        """Yield the lines of the given blocks (default: all) block by block."""
+        if last_block is None:
+            last_block = len(self.block_index) - 1
+        with open(self.path, "rb") as f:
+            for block_id in range(first_block, last_block + 1):
+                yield self.read_block(f, block_id)
+
+    def read_lines(self, start: int = 0, end: int | None = None) -> list[str]:
+        """Return lines[start:end] decompressing only the blocks which contain them."""
+        if end is None or end > self.n_lines:
+            end = self.n_lines
+        if start >= end:
+            return []
+
+        first_block = bisect.bisect_right(self.block_starts, start) - 1
+        last_block = bisect.bisect_right(self.block_starts, end - 1) - 1
+        lines = list(itertools.chain.from_iterable(self.iter_blocks(first_block, last_block)))
+        offset = self.block_starts[first_block]
+        return lines[start - offset:end - offset]
+
+
+def get_store_path(filepath) -> str:
+    return f"{filepath}{STORE_SUFFIX}"
+
+
+def _get_valid_store_path(filepath) -> str | None:
+    """Return the path of the compressed transcript if it exists and is not older than the plain text."""
+    store_path = get_store_path(filepath)
+    if not os.path.exists(store_path):
+        return None
+    if os.path.exists(filepath) and os.path.getmtime(filepath) > os.path.getmtime(store_path):
+        return None
+    return store_path
+
+
+def read_transcript_lines(filepath, start: int = 0, end: int | None = None) -> list[str]:
+    """Return lines[start:end] of a transcript (from the compressed store if available).
+
+    Args:
+        filepath: path of the plain text transcript (which might not exist if it was compressed)
+        start: index of the first line (0-based)
+        end: index after the last line (default: end of file)
+
+    Returns:
+        list[str]: lines including their line breaks
+    """
+    store_path = _get_valid_store_path(filepath)
+    if store_path is not None:
+        return StoreFile(store_path).read_lines(start, end)
+
+    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+        return list(itertools.islice(f, start, end))
+
+
+def iter_transcript_lines(filepath):
+    """Yield all lines of a transcript one by one (from the compressed store if available)."""
+    store_path = _get_valid_store_path(filepath)
+    if store_path is not None:
+        for lines in StoreFile(store_path).iter_blocks():
+            yield from lines
+        return
+
+    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+        yield from f
+
+
+def compress_transcript(filepath, block_lines: int = DEFAULT_BLOCK_LINES, remove_original: bool = False) -> None:
+    """Create the compressed version `<filepath>.hkz` of a plain text transcript."""
+    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+        lines = f.readlines()
+    write_store_file(lines, get_store_path(filepath), block_lines)
+    if remove_original:
+        os.remove(filepath)
+
+
+def compress_json_file(filepath, remove_original: bool = False) -> None:
+    """Write a compact gzipped version `<filepath>.gz` of a (pretty-printed) json file."""
+    with open(filepath, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    with gzip.open(f"{filepath}.gz", "wt", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    if remove_original:
+        os.remove(filepath)
+
+
+def load_json_file(filepath):
+    """Load a json file or its gzipped version `<filepath>.gz`."""
+    if not os.path.exists(filepath) and os.path.exists(f"{filepath}.gz"):
+        with gzip.open(f"{filepath}.gz", "rt", encoding="utf-8") as f:
+            return json.load(f)
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
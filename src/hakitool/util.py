@@ -1,5 +1,7 @@
-
+import os
 import logging
+import logging.handlers
+import queue
 import re
 import time
 
@@ -13,13 +15,82 @@ class NoColorFormatter(logging.Formatter):
     # Regex for ANSI colour codes
     ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
 
+    # (second, formatted time) of the last record: strftime is only called once per second
+    _time_cache = (None, "")
+
     def format(self, record):
         """Return logger message with terminal escapes removed."""
-        res =  " ".join((
-            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-            record.name,
-            re.sub(self.ANSI_RE, "", record.levelname),
-            re.sub(self.ANSI_RE, "", record.getMessage()),
-        ))
-
-        return res
+        second = int(record.created)
+        cached_second, timestamp = self._time_cache
+        if second != cached_second:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+            self._time_cache = (second, timestamp)
+
+        levelname = record.levelname
+        message = record.getMessage()
+        if "\x1b" in levelname:
+            levelname = self.ANSI_RE.sub("", levelname)
+        if "\x1b" in message:
+            message = self.ANSI_RE.sub("", message)
+        return " ".join((timestamp, record.name, levelname, message))
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler which leaves the formatting of the message to the background thread.
+
+    (The standard QueueHandler formats in the calling thread such that records can be pickled.
+    This is not necessary for an in-process queue, as long as the arguments are not modified
+    after the logging call.)
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class BackgroundLogWriter:
+    def __init__(self, handlers: list[logging.Handler]) -> None:
+        """Pass log records through a queue to handlers which run in a background thread.
+
+        Thus slow handlers (e.g. a file on a busy disk) do not block the logging thread.
+
+        Args:
+            handlers: the actual handlers (with their own formatters and levels)
+        """
+        self.queue = queue.SimpleQueue()
+        self.handlers = handlers
+        self.queue_handler = DeferredQueueHandler(self.queue)
+        self.listener = None
+
+    def start(self) -> None:
+        self.listener = logging.handlers.QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+        # threads do not survive fork() (e.g. uwsgi workers): start a new one in the child
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def _restart_in_child(self) -> None:
+        if self.listener is not None:
+            # records which were queued before the fork are written by the parent
+            self.queue = queue.SimpleQueue()
+            self.queue_handler.queue = self.queue
+            self.listener = logging.handlers.QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+
+    def stop(self) -> None:
+        """Write all queued records and stop the background thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+# transcript filenames start with the publish date (see download.py)
+PUBLISH_DATE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})_")
+
+
+def get_publish_date(filepath) -> str | None:
+    """Return the publish date ('YYYY-MM-DD') encoded in the filename or None."""
+    match = PUBLISH_DATE_RE.match(os.path.basename(filepath))
+    if match:
+        return match.group(1)
+    return None
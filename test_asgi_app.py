@@ -0,0 +1,74 @@
+import unittest
+import asyncio
+import time
+from hakitool.asgi_app import AsyncSearchService, CANCEL_EVENT_KEY
+
+
+def make_wsgi_app(delay=0.0, cancellable=True):
+    def wsgi_app(environ, start_response):
+        cancel_event = environ[CANCEL_EVENT_KEY]
+        end = time.time() + delay
+        while time.time() < end and not (cancellable and cancel_event.is_set()):
+            time.sleep(0.01)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [f"{environ['REQUEST_METHOD']} {environ['PATH_INFO']}?{environ['QUERY_STRING']}".encode()]
+    return wsgi_app
+
+
+async def call(service, path="/", disconnect=False):
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"a=1", "headers": []}
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if disconnect:
+            return {"type": "http.disconnect"}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    await service(scope, receive, send)
+    return sent
+
+
+class TestAsyncSearchService(unittest.TestCase):
+    def test_response(self):
+        """Test that the wsgi app is called with a proper environ"""
+        service = AsyncSearchService(make_wsgi_app())
+        sent = asyncio.run(call(service, "/file/x.txt"))
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(sent[0]["headers"], [(b"content-type", b"text/plain")])
+        self.assertEqual(sent[1]["body"], b"GET /file/x.txt?a=1")
+
+    def test_timeout_and_queue_limit(self):
+        """Test that slow requests time out and surplus requests are rejected"""
+        service = AsyncSearchService(make_wsgi_app(delay=1), max_workers=1, max_queue=1, timeout=0.2)
+
+        async def run_concurrently():
+            return await asyncio.gather(*(call(service) for _ in range(3)))
+
+        statuses = sorted(sent[0]["status"] for sent in asyncio.run(run_concurrently()))
+        self.assertEqual(statuses, [503, 504, 504])
+        service.executor.shutdown(wait=True)
+        self.assertEqual(service.pending, 0)
+
+    def test_busy_worker_counts_after_timeout(self):
+        """Test that a timed out request occupies its slot until the worker thread is done"""
+        service = AsyncSearchService(make_wsgi_app(delay=0.5, cancellable=False), max_workers=1, max_queue=0, timeout=0.1)
+        self.assertEqual(asyncio.run(call(service))[0]["status"], 504)
+        self.assertEqual(service.pending, 1)
+        self.assertEqual(asyncio.run(call(service))[0]["status"], 503)
+        service.executor.shutdown(wait=True)
+        self.assertEqual(service.pending, 0)
+
+    def test_disconnect(self):
+        """Test that no response is sent to disconnected clients"""
+        service = AsyncSearchService(make_wsgi_app(delay=1))
+        self.assertEqual(asyncio.run(call(service, disconnect=True)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import subprocess
+import sys
+from unittest import mock
+
+# maximum cumulative import time (microseconds) of the modules needed for a command
+STARTUP_BUDGET_US = 100_000
+
+# modules which are slow to import and must only be loaded by the subcommands which need them
+HEAVY_MODULES = ("flask", "werkzeug", "deploymentutils", "ipydex", "IPython", "packaging", "requests")
+
+
+def measure_import_time(code: str) -> dict[str, int]:
+    """Run code in a fresh interpreter with `-X importtime`; return {module: cumulative import time [us]}."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+class TestCliStartup(unittest.TestCase):
+    def check_startup(self, code: str, module: str):
+        # use the best of several runs to reduce noise
+        measurements = [measure_import_time(code) for _ in range(3)]
+        for times in measurements:
+            self.assertEqual([name for name in times if name.split(".")[0] in HEAVY_MODULES], [])
+
+        import_time = min(times[module] for times in measurements)
+        self.assertLess(import_time, STARTUP_BUDGET_US, f"cold start of {module} takes {import_time} us")
+
+    def test_version(self):
+        """Test that `hakitool --version` does not import heavy dependencies"""
+        code = "import sys; sys.argv = ['hakitool', '--version']; from hakitool.cli import main; main()"
+        self.check_startup(code, "hakitool.cli")
+
+    def test_search(self):
+        """Test that the modules needed for `hakitool search` and `hakitool index` start fast"""
+        self.check_startup("import hakitool.cli, hakitool.search_engine", "hakitool.search_engine")
+
+
+
+class TestDeployCommand(unittest.TestCase):
+    def test_deploy_args(self):
+        """Test that the lazily built parser of `hakitool deploy` accepts its arguments"""
+        res = subprocess.run(
+            [sys.executable, "-c", "from hakitool.cli import main; main()", "deploy", "--help"],
+            capture_output=True, text=True,
+        )
+        self.assertEqual(res.returncode, 0, res.stderr)
+        self.assertIn("usage: hakitool deploy", res.stdout)
+
+        from hakitool import cli, deploy
+        with mock.patch("sys.argv", ["hakitool", "deploy", "config.toml", "local"]), mock.patch.object(deploy, "main") as deploy_main:
+            cli.main()
+        args = deploy_main.call_args.kwargs["args"]
+        self.assertEqual((args.configfile, args.target), ("config.toml", "local"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+from hakitool.search_engine import TextFileIndexer, run_query
+from hakitool.index_build import IndexBuilder
+from hakitool.dedup import BYTES_PER_CANONICAL, NUM_HASHES, MinHasher, DuplicateDetector, similarity
+
+
+def make_text(rng, n_words=3000):
+    vocabulary = [f"wort{i}" for i in range(500)]
+    return [rng.choice(vocabulary) for _ in range(n_words)]
+
+
+def signature(words):
+    minhasher = MinHasher()
+    minhasher.update(words)
+    return minhasher.digest()
+
+
+class TestDedup(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        rng = random.Random(0)
+        self.original = make_text(rng)
+        # re-upload with a different intro and a few changed words
+        self.reupload = ["neues", "intro"] + self.original[:1000] + ["anders"] + self.original[1001:]
+        self.other = make_text(rng)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_signatures(self):
+        """Test the similarity estimation and the detection of duplicates"""
+        self.assertGreater(similarity(signature(self.original), signature(self.reupload)), 0.9)
+        self.assertLess(similarity(signature(self.original), signature(self.other)), 0.1)
+
+        # lines are shingled as one word sequence
+        minhasher = MinHasher()
+        minhasher.update(self.original[:10])
+        minhasher.update(self.original[10:])
+        self.assertEqual(minhasher.digest(), signature(self.original))
+
+        detector = DuplicateDetector()
+        self.assertIsNone(detector.find_canonical(signature(self.original)))
+        detector.add_canonical(0, signature(self.original))
+        detector.add_canonical(1, signature(self.other))
+        self.assertEqual(detector.find_canonical(signature(self.reupload)), 0)
+        self.assertIsNone(detector.find_canonical(signature([])))
+
+    def test_memory_budget(self):
+        """Test that the signatures are stored compactly and count against the memory budget"""
+        filepath = os.path.join(self.test_dir, "episode.txt")
+        with open(filepath, "w") as f:
+            f.write(" ".join(self.original))
+        builder = IndexBuilder(os.path.join(self.test_dir, "index.pkl"), memory_budget_mb=1, dedup_threshold=0.8)
+        try:
+            self.assertEqual(builder.available_bytes, 1e6)
+            builder.add_file(filepath)
+            self.assertEqual(len(builder.detector.signatures), NUM_HASHES)
+            self.assertEqual(builder.available_bytes, 1e6 - BYTES_PER_CANONICAL)
+        finally:
+            builder.cleanup()
+
+    def test_short_texts(self):
+        """Test that short unrelated transcripts are not taken for duplicates"""
+        first = "hallo und willkommen zu einer neuen folge unseres podcasts heute mit".split()
+        second = "das war es schon wieder bis zur nächsten woche und tschüss".split()
+        self.assertLess(similarity(signature(first), signature(second)), 0.1)
+
+        detector = DuplicateDetector()
+        detector.add_canonical(0, signature(first))
+        self.assertIsNone(detector.find_canonical(signature(second)))
+
+        # identical short transcripts are kept as well (too few shingles for a reliable estimate)
+        for filename in ("2025-01-01_a.txt", "2025-01-02_b.txt", "2025-01-03_c.txt"):
+            with open(os.path.join(self.test_dir, filename), "w") as f:
+                f.write(" ".join(first if filename != "2025-01-02_b.txt" else second) + "\n")
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "index.pkl"))
+        indexer.build_index(dedup_threshold=0.8)
+        self.assertEqual(len(indexer.files), 3)
+        self.assertEqual(indexer.aliases, {})
+
+    def test_index(self):
+        """Test that near-duplicates are not indexed but listed as aliases"""
+        texts = {
+            "2025-01-01_episode.txt": self.original,
+            "2025-02-01_episode-reupload.txt": self.reupload,
+            "2025-03-01_other.txt": self.other,
+        }
+        for filename, words in texts.items():
+            with open(os.path.join(self.test_dir, filename), "w") as f:
+                f.write(" ".join(words) + "\nklimawandel\n")
+        path = lambda filename: os.path.join(self.test_dir, filename)
+
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "index.pkl"))
+        indexer.build_index(dedup_threshold=0.8)
+        self.assertEqual(indexer.files, [path("2025-01-01_episode.txt"), path("2025-03-01_other.txt")])
+        self.assertEqual(indexer.aliases, {path("2025-01-01_episode.txt"): [path("2025-02-01_episode-reupload.txt")]})
+
+        record = run_query(indexer, "klimawandel")
+        self.assertEqual(record["n_files"], 2)
+        self.assertEqual(record["results"][0]["aliases"], [path("2025-02-01_episode-reupload.txt")])
+        self.assertEqual(record["results"][1]["aliases"], [])
+
+        # the full search (index can not narrow down the query) skips the aliases as well
+        self.assertEqual(len(indexer.search_in_files("a")), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
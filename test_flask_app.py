@@ -0,0 +1,98 @@
+import unittest
+import os
+import shutil
+import logging
+import pickle
+import tempfile
+import threading
+import time
+from unittest import mock
+from hakitool import flask_app
+from hakitool.search_engine import TextFileIndexer
+
+
+class TestFlaskApp(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.test_dir, "episode.txt"), "w") as f:
+            f.write("Klima und Wetter\n")
+        flask_app.c.logger = logging.getLogger(flask_app.APP_NAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_client(self, **config):
+        config.update(SEARCH_DIRECTORY=self.test_dir)
+        return flask_app.create_app(config).test_client()
+
+    def test_regex_disabled(self):
+        """Test that regular expressions are rejected unless enabled in the config"""
+        client = self.create_client()
+        self.assertNotIn(b'name="regex"', client.get("/").data)
+        response = client.post("/", data={"search_term": r"(\w+\s?)+[!?]", "regex": "1"})
+        self.assertIn(b"regular expressions are disabled", response.data)
+
+        client = self.create_client(ALLOW_REGEX=True)
+        self.assertIn(b'name="regex"', client.get("/").data)
+        response = client.post("/", data={"search_term": r"kl\w+", "regex": "1"})
+        self.assertIn(b"episode.txt", response.data)
+
+    def test_boolean_mode(self):
+        """Test that boolean queries are only evaluated if requested"""
+        client = self.create_client()
+        self.assertNotIn(b"episode.txt", client.post("/", data={"search_term": "klima OR regen"}).data)
+        self.assertIn(b"episode.txt", client.post("/", data={"search_term": "klima OR regen", "boolean": "1"}).data)
+        response = client.post("/", data={"search_term": "klima OR (", "boolean": "1"})
+        self.assertIn(b"invalid query", response.data)
+
+    def test_outdated_index(self):
+        """Test that an outdated index is reported once and loaded again only after it changed"""
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.test_dir)
+        with open("file_index.pkl", "wb") as f:
+            pickle.dump({"index_version": 1}, f)
+        client = self.create_client()
+
+        with mock.patch.object(TextFileIndexer, "load_index", autospec=True, side_effect=TextFileIndexer.load_index) as load_index:
+            with self.assertLogs("hakitool.search", "WARNING") as logs:
+                for _ in range(3):
+                    self.assertEqual(client.get("/").status_code, 200)
+            self.assertEqual(load_index.call_count, 1)
+            self.assertIn("outdated", logs.output[0])
+
+            TextFileIndexer(self.test_dir, "file_index.pkl").build_index(load=False)
+            os.utime("file_index.pkl", ns=(0, 0))
+            response = client.post("/", data={"search_term": "klima"})
+            self.assertEqual(load_index.call_count, 2)
+        self.assertIn(b"episode.txt", response.data)
+
+    def test_concurrent_first_requests(self):
+        """Test that concurrent first requests load the index once and only see the complete index"""
+        index_file = os.path.join(self.test_dir, "index.pkl")
+        TextFileIndexer(self.test_dir, index_file).build_index(load=False)
+        load_index = TextFileIndexer.load_index
+        calls = []
+
+        def slow_load_index(indexer):
+            calls.append(indexer)
+            time.sleep(0.2)
+            indexer.index_file = index_file
+            return load_index(indexer)
+
+        app = flask_app.create_app({"SEARCH_DIRECTORY": self.test_dir})
+        responses = []
+        with mock.patch.object(TextFileIndexer, "load_index", slow_load_index):
+            threads = [
+                threading.Thread(target=lambda: responses.append(app.test_client().get("/timeline?term=klima")))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
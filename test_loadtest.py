@@ -0,0 +1,48 @@
+import unittest
+import io
+import os
+import json
+import shutil
+import tempfile
+import contextlib
+from unittest import mock
+from hakitool import cli
+from hakitool.loadtest import make_corpus, percentile, run_load_test
+
+
+class TestLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (50, 90, 99, 100)], [50, 90, 99, 100])
+        self.assertEqual(percentile([3.0], 99), 3.0)
+
+    def test_load_test(self):
+        """Test a short load test against two server processes"""
+        paths = make_corpus(self.test_dir, n_files=5, n_lines=50, n_long_files=1)
+        self.assertEqual(len(paths), 6)
+        self.assertTrue(all(os.path.exists(os.path.join(self.test_dir, path)) for path in paths))
+
+        report = run_load_test(self.test_dir, processes=2, threads=2, concurrency=3, duration=0.5, file_ratio=0.5)
+        self.assertGreater(report["requests"], 0)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(report["requests"], sum(stats["n"] for stats in report["latency_ms"].values()))
+        self.assertEqual(len(report["workers"]), 2)
+
+    def test_json_output(self):
+        """Test that `hakitool loadtest --json` prints only the report to stdout"""
+        make_corpus(self.test_dir, n_files=3, n_lines=20, n_long_files=0)
+        argv = ["hakitool", "loadtest", "--root", self.test_dir, "-p", "1", "-c", "1", "--duration", "0.2", "--json"]
+        out = io.StringIO()
+        with mock.patch("sys.argv", argv), contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            cli.main()
+        self.assertEqual(json.loads(out.getvalue())["processes"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
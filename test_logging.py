@@ -0,0 +1,72 @@
+import unittest
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from hakitool import flask_app
+from hakitool.util import NoColorFormatter, BackgroundLogWriter
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.threads.add(threading.current_thread())
+        self.lines.append(self.format(record))
+
+
+class TestLogging(unittest.TestCase):
+    def test_no_color_formatter(self):
+        formatter = NoColorFormatter()
+        record = logging.LogRecord("hakitool", logging.INFO, __file__, 1, "\x1b[31mred\x1b[0m %s", ("text",), None)
+        record.created = 1760000000.5
+        line = formatter.format(record)
+        self.assertTrue(line.endswith(" hakitool INFO red text"))
+        self.assertEqual(formatter.format(record), line)
+
+    def test_background_writer(self):
+        """Test that records are formatted and written in the background thread"""
+        handler = RecordingHandler()
+        handler.setFormatter(NoColorFormatter())
+        writer = BackgroundLogWriter([handler])
+        logger = logging.getLogger("hakitool.test_background")
+        logger.propagate = False
+        logger.addHandler(writer.queue_handler)
+        logger.setLevel(logging.DEBUG)
+        writer.start()
+        try:
+            logger.info("search query=%r files=%d", "klima", 3)
+        finally:
+            writer.stop()
+            logger.removeHandler(writer.queue_handler)
+
+        self.assertEqual(len(handler.lines), 1)
+        self.assertTrue(handler.lines[0].endswith("hakitool.test_background INFO search query='klima' files=3"))
+        self.assertNotIn(threading.current_thread(), handler.threads)
+
+    def test_access_log(self):
+        """Test the access log line of a search"""
+        test_dir = tempfile.mkdtemp()
+        with open(os.path.join(test_dir, "episode.txt"), "w") as f:
+            f.write("Klima und Wetter\nKlima\n")
+        flask_app.c.logger = logging.getLogger(flask_app.APP_NAME)
+        handler = RecordingHandler()
+        flask_app.access_logger.addHandler(handler)
+        flask_app.access_logger.setLevel(logging.INFO)
+        try:
+            client = flask_app.create_app({"SEARCH_DIRECTORY": test_dir}).test_client()
+            client.post("/", data={"search_term": "klima"})
+        finally:
+            flask_app.access_logger.removeHandler(handler)
+            shutil.rmtree(test_dir)
+
+        self.assertEqual(len(handler.lines), 1)
+        self.assertRegex(handler.lines[0], r"^search query='klima' regex=0 boolean=0 filter=MetadataFilter\(\) files=1 matches=2 ms=\d+\.\d$")
+
+
+if __name__ == '__main__':
+    unittest.main()
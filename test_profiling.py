@@ -0,0 +1,62 @@
+import unittest
+import io
+import os
+import shutil
+import logging
+import tempfile
+from hakitool import flask_app
+from hakitool.profiling import RequestProfiler, PROFILE_HEADER, load_request_log, summarize
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.profile_dir = os.path.join(self.test_dir, "profiles")
+        with open(os.path.join(self.test_dir, "episode.txt"), "w") as f:
+            f.write("Klima und Wetter\n")
+        flask_app.c.logger = logging.getLogger(flask_app.APP_NAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_client(self, **config):
+        config.update(SEARCH_DIRECTORY=self.test_dir, PROFILE_DIR=self.profile_dir)
+        return flask_app.create_app(config).test_client()
+
+    def test_disabled(self):
+        """Test that view functions are not wrapped if profiling is disabled"""
+        def view():
+            pass
+        self.assertIs(RequestProfiler().profile(view), view)
+
+        client = self.create_client()
+        self.assertEqual(client.post("/", data={"search_term": "klima"}, headers={PROFILE_HEADER: "x"}).status_code, 200)
+        self.assertFalse(os.path.exists(self.profile_dir))
+
+    def test_token(self):
+        """Test profiling of requests with the admin header and the summary"""
+        client = self.create_client(PROFILE_TOKEN="secret")
+        client.post("/", data={"search_term": "klima"})
+        client.post("/", data={"search_term": "klima"}, headers={PROFILE_HEADER: "wrong"})
+        self.assertFalse(os.path.exists(self.profile_dir))
+
+        response = client.post("/", data={"search_term": "klima"}, headers={PROFILE_HEADER: "secret"})
+        self.assertEqual(response.status_code, 200)
+        # (the view is also profiled if it fails, here: relative path)
+        client.get(f"/file/{self.test_dir.lstrip('/')}/episode.txt", headers={PROFILE_HEADER: "secret"})
+
+        records = load_request_log(self.profile_dir)
+        self.assertEqual([(r["endpoint"], r["search_term"]) for r in records], [("home", "klima"), ("show_file", None)])
+
+        out = io.StringIO()
+        self.assertEqual(summarize(self.profile_dir, endpoint="home", stream=out), 1)
+        self.assertIn("search_in_files", out.getvalue())
+
+    def test_sample_rate(self):
+        client = self.create_client(PROFILE_SAMPLE_RATE=1.0)
+        client.post("/", data={"search_term": "klima"})
+        self.assertEqual(len(load_request_log(self.profile_dir)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os
+import shutil
+import tempfile
+import random
+from hakitool.search_engine import TextFileIndexer
+from hakitool.query import (
+    QueryPlanner, QuerySyntaxError, difference_sorted, intersect_sorted, is_boolean_query, parse_boolean_query
+)
+
+
+class TestBooleanQuery(unittest.TestCase):
+    def test_parse(self):
+        """Test operator precedence, grouping and negation"""
+        self.assertEqual(
+            repr(parse_boolean_query("klima wandel OR krise")),
+            "Or([And([Term('klima'), Term('wandel')]), Term('krise')])",
+        )
+        self.assertEqual(
+            repr(parse_boolean_query("Klima AND (wandel OR krise) -politik")),
+            "And([Term('klima'), Or([Term('wandel'), Term('krise')]), Not(Term('politik'))])",
+        )
+        self.assertEqual(repr(parse_boolean_query("NOT -x")), "Not(Not(Term('x')))")
+        for query in ("", "(klima", "klima)", "klima OR", "AND"):
+            with self.assertRaises(QuerySyntaxError):
+                parse_boolean_query(query)
+
+        self.assertTrue(is_boolean_query("klima -politik"))
+        self.assertTrue(is_boolean_query("klima OR wetter"))
+        self.assertFalse(is_boolean_query("haken dran"))
+        self.assertFalse(is_boolean_query("e-mail or covid-19"))
+        self.assertFalse(is_boolean_query("("))
+
+    def test_set_operations(self):
+        """Test galloping and set based intersection/difference against python sets"""
+        rng = random.Random(0)
+        for n_a, n_b in ((5, 1000), (100, 120), (0, 10), (50, 50)):
+            a = sorted(rng.sample(range(2000), n_a))
+            b = sorted(rng.sample(range(2000), n_b))
+            self.assertEqual(intersect_sorted(a, b), sorted(set(a) & set(b)))
+            self.assertEqual(intersect_sorted(b, a), sorted(set(a) & set(b)))
+            self.assertEqual(difference_sorted(a, b), sorted(set(a) - set(b)))
+
+    def test_planner(self):
+        """Test evaluation and short-circuiting on posting lists"""
+        index = {"a": [0, 1, 2, 3], "b": [1, 3, 5], "c": [5]}
+        planner = QueryPlanner(index, 6)
+        evaluate = lambda query: planner.evaluate(parse_boolean_query(query))
+        self.assertEqual(evaluate("a b"), [1, 3])
+        self.assertEqual(evaluate("a OR c"), [0, 1, 2, 3, 5])
+        self.assertEqual(evaluate("(a OR c) -b"), [0, 2])
+        self.assertEqual(evaluate("NOT a"), [4, 5])
+        self.assertEqual(planner.cost(parse_boolean_query("a b c")), 1)
+
+        # the empty posting list of the unknown word is evaluated first, then evaluation stops
+        evaluated = []
+        evaluate_node = planner.evaluate
+
+        def counting_evaluate(node):
+            evaluated.append(node)
+            return evaluate_node(node)
+
+        planner.evaluate = counting_evaluate
+        self.assertEqual(evaluate("a (b OR c) unknown"), [])
+        self.assertEqual([repr(node) for node in evaluated[1:]], ["Term('unknown')"])
+
+
+class TestBooleanSearch(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        episodes = {
+            "a.txt": "Der Klimawandel.\nKlima und Politik.\n",
+            "b.txt": "Klima\nWetter\n",
+            "c.txt": "Wetter und Politik\n",
+        }
+        for filename, content in episodes.items():
+            with open(os.path.join(self.test_dir, filename), "w") as f:
+                f.write(content)
+        self.indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "index.pkl"))
+        self.indexer.build_index()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_search(self):
+        """Test boolean queries in search_in_files (whole words, highlighted lines)"""
+        filename = lambda name: os.path.join(self.test_dir, name)
+        self.assertEqual(self.indexer.search_boolean("(klima OR wetter) -politik"), [filename("b.txt")])
+
+        results = self.indexer.search_in_files("(klima OR wetter) politik", boolean=True)
+        self.assertEqual([(name, n_matches) for name, _, n_matches in results], [(filename("a.txt"), 1), (filename("c.txt"), 1)])
+        self.assertEqual(results[0][1][0]["match_lines"], [2])
+
+        results = self.indexer.search_in_files("NOT klima", boolean=True)
+        self.assertEqual(results, [(filename("c.txt"), [], 0)])
+
+        # without a loaded index the query is evaluated on all files
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "missing.pkl"))
+        self.assertEqual(indexer.search_boolean("(klima OR wetter) -politik"), [filename("b.txt")])
+        self.assertEqual(len(indexer.search_in_files("klima OR wetter", boolean=True)), 3)
+
+    def test_substring_by_default(self):
+        """Test that queries with boolean syntax are substring searches unless boolean mode is requested"""
+        with open(os.path.join(self.test_dir, "d.txt"), "w") as f:
+            f.write("Teil 2 (Teil 2) und NOT\n")
+        with open(os.path.join(self.test_dir, "e.txt"), "w") as f:
+            f.write("Teil eins, Kapitel 2\n")
+        self.indexer.build_index()
+        self.assertEqual([os.path.basename(name) for name, *_ in self.indexer.search_in_files("(Teil 2)")], ["d.txt"])
+        self.assertEqual(len(self.indexer.search_in_files("NOT")), 1)
+        self.assertEqual(len(self.indexer.search_in_files("klima OR wetter")), 0)
+        with self.assertRaises(ValueError):
+            self.indexer.search_in_files("klima OR wetter", regex=True, boolean=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,12 @@
 import unittest
 import os
+import json
+import shutil
 import tempfile
-from search_engine import TextFileIndexer
+from unittest import mock
+from hakitool import index_build
+from hakitool.search_engine import TextFileIndexer, required_literals, search_batch, merge_windows, select_windows
+from hakitool.metadata import MetadataFilter, parse_query
 
 class TestTextFileIndexer(unittest.TestCase):
     def setUp(self):
@@ -42,11 +47,12 @@ And some different words.""")
         results = self.indexer.search_in_files("banana")
         self.assertEqual(len(results), 2)  # Should find in both files
         
-        # Check each result has filename and list of contexts
-        for filename, contexts in results:
+        # Check each result has filename, list of contexts and number of matches
+        for filename, contexts, n_matches in results:
             self.assertTrue(isinstance(contexts, list))
             self.assertTrue(len(contexts) >= 1)
-            self.assertTrue(any("banana" in ctx.lower() for ctx in contexts))
+            self.assertTrue(n_matches >= 1)
+            self.assertTrue(any("banana" in ctx["text"].lower() for ctx in contexts))
 
     def test_search_in_files_no_match(self):
         """Test searching for non-existent term"""
@@ -57,27 +63,207 @@ And some different words.""")
         """Test that search is case insensitive"""
         results = self.indexer.search_in_files("BANANA")
         self.assertEqual(len(results), 2)
-        for _, contexts in results:
-            self.assertTrue(any("banana" in ctx.lower() for ctx in contexts))
+        for _, contexts, _ in results:
+            self.assertTrue(any("banana" in ctx["text"].lower() for ctx in contexts))
 
     def test_result_structure(self):
-        """Test that results have correct structure (filename, list of contexts)"""
+        """Test that results have correct structure (filename, list of contexts, number of matches)"""
         results = self.indexer.search_in_files("apple")
         self.assertEqual(len(results), 1)  # Only in file1
-        filename, contexts = results[0]
+        filename, contexts, n_matches = results[0]
         self.assertEqual(filename, self.file1)
+        self.assertEqual(n_matches, 1)
         self.assertTrue(isinstance(contexts, list))
-        self.assertTrue(all(isinstance(ctx, str) for ctx in contexts))
+        self.assertTrue(all(isinstance(ctx, dict) for ctx in contexts))
+        self.assertEqual(contexts[0]["start_line"], 1)
+        self.assertEqual(contexts[0]["match_lines"], [2])
 
     def test_multiple_matches_in_single_file(self):
-        """Test that multiple matches in one file are all returned as separate contexts"""
+        """Test that overlapping contexts of multiple matches in one file are merged"""
         results = self.indexer.search_in_files("banana")
         banana_file_results = [r for r in results if r[0] == self.file2]
         self.assertEqual(len(banana_file_results), 1)
-        _, contexts = banana_file_results[0]
-        self.assertEqual(len(contexts), 3)  # Should find 3 matches in file2
-        for ctx in contexts:
-            self.assertTrue("banana" in ctx.lower())
+        _, contexts, n_matches = banana_file_results[0]
+        self.assertEqual(n_matches, 3)  # Should find 3 matches in file2
+        self.assertEqual(len(contexts), 1)
+        self.assertEqual(contexts[0]["match_lines"], [2, 3, 4])
+        self.assertEqual(contexts[0]["text"].lower().count("banana"), 3)
+
+    def test_snippet_selection(self):
+        """Test merging of context windows and selection of the densest ones"""
+        windows = merge_windows([0, 2, 10, 30, 31, 32], n_lines=40, context_lines=1)
+        self.assertEqual(windows, [(0, 4, [0, 2]), (9, 12, [10]), (29, 34, [30, 31, 32])])
+
+        # long runs of matches are split into adjacent windows of limited size
+        windows = merge_windows(list(range(20)), n_lines=20, context_lines=1)
+        self.assertEqual([window[:2] for window in windows], [(0, 9), (9, 18), (18, 20)])
+        self.assertEqual([window[2] for window in windows], [list(range(9)), list(range(9, 18)), [18, 19]])
+
+        windows = merge_windows([0, 2, 10, 30, 31, 32], n_lines=40, context_lines=1)
+        self.assertEqual(select_windows(windows, 2), [windows[0], windows[2]])
+        self.assertEqual(select_windows(windows, None), windows)
+
+        results = self.indexer.search_in_files("banana", context_lines=0, max_snippets=1)
+        _, contexts, n_matches = results[1]
+        self.assertEqual(n_matches, 3)
+        self.assertEqual(contexts, [{"text": "It has a banana.\nBanana appears again here.\nAnd some more banana.\n",
+                                     "start_line": 2, "match_lines": [2, 3, 4]}])
+
+    def test_substring_search(self):
+        """Test that substrings inside of words are found via the trigram index"""
+        self.assertEqual(self.indexer.search_in_index("anan"), [])
+        self.assertEqual(self.indexer.search_in_trigram_index(["anan"]), [self.file1, self.file2])
+        self.assertEqual(self.indexer.search_in_trigram_index(["pple"]), [self.file1])
+
+        results = self.indexer.search_in_files("anan")
+        self.assertEqual(len(results), 2)
+
+        # a full search is logged (not printed, the search runs on the request path of the web app)
+        with self.assertLogs("hakitool.search", "INFO") as logs:
+            self.assertEqual(len(self.indexer.search_in_files("a")), 2)
+        self.assertIn("Performing full search", logs.output[0])
+
+    def test_regex_search(self):
+        """Test regex queries and the extraction of required literals"""
+        self.assertEqual(required_literals(r"ban+ana\b"), ["ba", "n", "ana"])
+        self.assertEqual(required_literals(r"apple|banana"), [])
+        self.assertEqual(required_literals(r"file (one|two)\."), ["file ", "."])
+
+        results = self.indexer.search_in_files(r"^b\w+ appears", regex=True)
+        self.assertEqual(len(results), 1)
+        filename, contexts, _ = results[0]
+        self.assertEqual(filename, self.file2)
+        self.assertEqual(len(contexts), 1)
+
+        results = self.indexer.search_in_files(r"file (one|two)\.", regex=True)
+        self.assertEqual(len(results), 2)
+
+        # if the private parser of the re module changes, all files are searched
+        import re
+        with mock.patch.object(re._parser, "parse", side_effect=AttributeError):
+            self.assertEqual(required_literals(r"ban+ana\b"), [])
+            self.assertEqual(len(self.indexer.search_in_files(r"file (one|two)\.", regex=True)), 2)
+
+    def test_build_with_small_memory_budget(self):
+        """Test that merging many on-disk runs yields the same index"""
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "small.pkl"))
+        indexer.build_index(memory_budget_mb=0.001)
+        os.remove(indexer.index_file)
+        self.assertEqual(indexer.files, self.indexer.files)
+        self.assertEqual(indexer.index, self.indexer.index)
+        self.assertEqual(indexer.trigram_index, self.indexer.trigram_index)
+        self.assertEqual(indexer.index["banana"], [0, 1])
+        # temporary run files are removed
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["test1.txt", "test2.txt"])
+
+    def test_multi_pass_merge(self):
+        """Test that runs are merged in several passes if there are more runs than the fan-in"""
+        for i in range(3, 8):
+            with open(os.path.join(self.test_dir, f"test{i}.txt"), "w") as f:
+                f.write(f"File number {i} with a banana.\n")
+        reference = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "reference.pkl"))
+        reference.build_index()
+        os.remove(reference.index_file)
+
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "small.pkl"))
+        with mock.patch.object(index_build, "MERGE_FAN_IN", 2):
+            indexer.build_index(memory_budget_mb=0.001)
+        os.remove(indexer.index_file)
+        self.assertEqual(indexer.files, reference.files)
+        self.assertEqual(indexer.index, reference.index)
+        self.assertEqual(indexer.word_counts, reference.word_counts)
+        self.assertEqual(indexer.trigram_index, reference.trigram_index)
+        self.assertEqual(indexer.index["banana"], list(range(7)))
+        for i in range(3, 8):
+            os.remove(os.path.join(self.test_dir, f"test{i}.txt"))
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["test1.txt", "test2.txt"])
+
+    def test_search_batch(self):
+        """Test batch mode with and without worker processes"""
+        queries = ["banana", "apple from:2025-01-01", "(", "pple"]
+        records = list(search_batch(self.indexer, queries))
+        self.assertEqual([record["query"] for record in records], queries)
+        self.assertEqual([record.get("n_files") for record in records], [2, 0, 0, 1])
+
+        self.assertEqual(list(search_batch(self.indexer, queries, jobs=2)), records)
+
+        # with worker processes the queries are read lazily and results are streamed
+        consumed = []
+
+        def many_queries():
+            for i in range(100):
+                consumed.append(i)
+                yield "banana"
+
+        batch = search_batch(self.indexer, many_queries(), jobs=2)
+        self.assertEqual(next(batch)["n_files"], 2)
+        self.assertLessEqual(len(consumed), 8)
+        batch.close()
+
+        records = list(search_batch(self.indexer, queries, regex=True))
+        self.assertIn("error", records[2])
+
+
+class TestMetadataFilter(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary output directory with transcripts and json files"""
+        self.test_dir = tempfile.mkdtemp()
+        self.fulltext_dir = os.path.join(self.test_dir, "fulltext")
+        os.mkdir(self.fulltext_dir)
+        for date, title in [("2024-12-03", "Rückblick"), ("2025-02-11", "Live vom Kongress"), ("2025-06-18", "Suche")]:
+            prefix = f"{date}_{title.lower()}_german_subtitles"
+            with open(os.path.join(self.fulltext_dir, f"{prefix}.txt"), "w") as f:
+                f.write(f"Thema heute: {title}\nUnd wieder der Klimawandel.\n")
+            with open(os.path.join(self.test_dir, f"{prefix}.json"), "w") as f:
+                json.dump({"video_id": date, "video_title": title, "publish_date": date, "podcast": "Haken Dran"}, f)
+
+        self.indexer = TextFileIndexer(self.fulltext_dir, os.path.join(self.test_dir, "index.pkl"))
+        self.indexer.build_index()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_parse_query(self):
+        """Test the separation of filter tokens from the text query"""
+        text, metadata_filter = parse_query('klima from:2025-01-01 title:"vom kongress" wandel')
+        self.assertEqual(text, "klima wandel")
+        self.assertEqual(metadata_filter.title, "vom kongress")
+        self.assertIsNone(metadata_filter.podcast)
+        self.assertFalse(metadata_filter.is_empty())
+        self.assertTrue(parse_query("klima")[1].is_empty())
+        self.assertRaises(ValueError, parse_query, "klima from:2025-13-01")
+
+    def test_filtered_search(self):
+        """Test that metadata filters compose with text queries"""
+        self.assertEqual(self.indexer.metadata.titles, ["Rückblick", "Live vom Kongress", "Suche"])
+        self.assertEqual(self.indexer.metadata.get_publish_date(1), "2025-02-11")
+
+        self.assertEqual(len(self.indexer.search_in_files("klima")), 3)
+
+        results = self.indexer.search_in_files("klima", metadata_filter=MetadataFilter(date_from="2025-01-01"))
+        self.assertEqual(len(results), 2)
+
+        metadata_filter = MetadataFilter(date_from="2025-01-01", date_to="2025-03-01", podcast="haken")
+        results = self.indexer.search_in_files("klima", metadata_filter=metadata_filter)
+        self.assertEqual([os.path.basename(filename)[:10] for filename, *_ in results], ["2025-02-11"])
+
+        results = self.indexer.search_in_files("klima", metadata_filter=MetadataFilter(title="such"))
+        self.assertEqual(len(results), 1)
+
+    def test_podcast_fallback(self):
+        """Test that json files of older downloads (without podcast name) match the podcast filter"""
+        for filename in os.listdir(self.test_dir):
+            if filename.endswith(".json"):
+                path = os.path.join(self.test_dir, filename)
+                with open(path) as f:
+                    data = json.load(f)
+                del data["podcast"]
+                with open(path, "w") as f:
+                    json.dump(data, f)
+        self.indexer.build_index()
+        results = self.indexer.search_in_files("klima", metadata_filter=MetadataFilter(podcast="haken dran"))
+        self.assertEqual(len(results), 3)
+
 
 if __name__ == '__main__':
     unittest.main()
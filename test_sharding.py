@@ -0,0 +1,120 @@
+import unittest
+import io
+import os
+import json
+import random
+import shutil
+import tempfile
+import contextlib
+from unittest import mock
+from hakitool import cli
+from hakitool.search_engine import TextFileIndexer
+from hakitool.sharding import ShardedIndex, ShardLayout
+
+
+class TestShardedIndex(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary directory with dated test files"""
+        self.test_dir = tempfile.mkdtemp()
+        self.shard_dir = os.path.join(self.test_dir, "shards")
+        for i, date in enumerate(["2024-10-22", "2024-12-03", "2025-02-11", "2025-05-20", "2025-06-18"]):
+            with open(os.path.join(self.test_dir, f"{date}_episode-{i}.txt"), "w") as f:
+                f.write(f"Episode {i} of the podcast.\nToday: klimawandel and more.\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_layout(self):
+        """Test the assignment of files to shards"""
+        layout = ShardLayout("date", 3, ["2025-01-01", "2025-06-01"])
+        self.assertEqual(layout.shard_of("2024-10-22_x.txt"), 0)
+        self.assertEqual(layout.shard_of("2025-01-01_x.txt"), 1)
+        self.assertEqual(layout.shard_of("dir/2025-06-18_x.txt"), 2)
+        self.assertEqual(layout.shard_of("undated.txt"), 0)
+
+        layout = ShardLayout("hash", 3)
+        self.assertIn(layout.shard_of("2024-10-22_x.txt"), range(3))
+
+    def test_scatter_gather(self):
+        """Test that the sharded search gives the same result as the unsharded one"""
+        sharded_index = ShardedIndex(self.test_dir, self.shard_dir, n_shards=2)
+        sharded_index.build()
+        self.assertEqual(sorted(os.listdir(self.shard_dir)), ["manifest.json", "shard_0.pkl", "shard_1.pkl"])
+
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "full_index.pkl"))
+        indexer.build_index()
+        expected = indexer.search_in_files("klima")
+        self.assertEqual(len(expected), 5)
+
+        with sharded_index:
+            self.assertEqual(sharded_index.search_in_files("klima"), expected)
+            self.assertEqual(sharded_index.search_in_files("klima", top_k=2), expected[:2])
+
+            # rebuild a single shard while the workers are running
+            with open(os.path.join(self.test_dir, "2025-07-01_episode-5.txt"), "w") as f:
+                f.write("klimawandel again\n")
+            sharded_index.build([1])
+            self.assertEqual(len(sharded_index.search_in_files("klima")), 6)
+
+            # shard ids which do not belong to the layout are rejected (also while workers run)
+            with self.assertRaises(ValueError):
+                sharded_index.build([5])
+        self.assertNotIn("shard_5.pkl", os.listdir(self.shard_dir))
+
+        # the layout of an existing index can not be changed implicitly
+        with self.assertRaises(ValueError):
+            ShardedIndex(self.test_dir, self.shard_dir, n_shards=8)
+        with self.assertRaises(ValueError):
+            ShardedIndex(self.test_dir, self.shard_dir, strategy="hash")
+        self.assertEqual(ShardedIndex(self.test_dir, self.shard_dir, n_shards=2, strategy="date").n_shards, 2)
+
+    def test_top_k(self):
+        """Test that the top-k results of all shards are the files with the most matches"""
+        for i, n_lines in enumerate([1, 4, 2, 5, 3]):
+            filename = next(name for name in os.listdir(self.test_dir) if name.endswith(f"episode-{i}.txt"))
+            with open(os.path.join(self.test_dir, filename), "w") as f:
+                f.write("klima\n" * n_lines)
+        sharded_index = ShardedIndex(self.test_dir, self.shard_dir, n_shards=2)
+        sharded_index.build()
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "full_index.pkl"))
+        indexer.build_index()
+
+        expected = indexer.search_in_files("klima", top_k=3)
+        self.assertEqual([n_matches for *_, n_matches in expected], [5, 4, 3])
+        with sharded_index:
+            self.assertEqual(sharded_index.search_in_files("klima", top_k=3), expected)
+
+    def run_cli(self, *argv) -> str:
+        out = io.StringIO()
+        with mock.patch("sys.argv", ["hakitool", *argv]), contextlib.redirect_stdout(out):
+            cli.main()
+        return out.getvalue()
+
+    def test_cli(self):
+        """Test search and timeline on a sharded index via the command line"""
+        words = [random.Random(0).choice(["wort", "klima", "wetter", "podcast", "folge"]) + str(i) for i in range(300)]
+        for filename in ("2024-10-22_episode-0.txt", "2024-10-23_reupload.txt"):
+            with open(os.path.join(self.test_dir, filename), "w") as f:
+                f.write("Today: klimawandel\n" + " ".join(words) + "\n")
+        path = lambda filename: os.path.join(self.test_dir, filename)
+        directory_args = ["--directory", self.test_dir, "--shard-dir", self.shard_dir]
+        self.run_cli("index", "--shards", "2", "--dedup", *directory_args)
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            self.run_cli("index", "--shards", "8", *directory_args)
+
+        records = [json.loads(line) for line in self.run_cli("search", "klimawandel", "nichts", *directory_args).splitlines()]
+        self.assertEqual([record["n_files"] for record in records], [5, 0])
+        results = {result["filename"]: result["aliases"] for result in records[0]["results"]}
+        self.assertEqual(results[path("2024-10-22_episode-0.txt")], [path("2024-10-23_reupload.txt")])
+        self.assertEqual(results[path("2025-06-18_episode-4.txt")], [])
+
+        record = json.loads(self.run_cli("search", "klimawandel", "--top-k", "1", *directory_args))
+        self.assertEqual(record["n_files"], 1)
+
+        timeline = json.loads(self.run_cli("timeline", "klimawandel", "--json", *directory_args))
+        self.assertEqual(sum(period["count"] for period in timeline), 5)
+        self.assertEqual(timeline[0], {"period": "2024-10", "count": 1, "episodes": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import shutil
+import tempfile
+import datetime
+from hakitool.search_engine import TextFileIndexer
+from hakitool.metadata import MetadataFilter
+from hakitool.timeline import aggregate_counts, merge_timelines
+
+
+def ordinal(date: str) -> int:
+    return datetime.date.fromisoformat(date).toordinal()
+
+
+class TestTimeline(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary directory with dated test files"""
+        self.test_dir = tempfile.mkdtemp()
+        episodes = {
+            "2024-12-30_a.txt": "Klima klima\nwetter\n",
+            "2025-01-02_b.txt": "Das Klima.\n",
+            "2025-03-10_c.txt": "klima, KLIMA und klima\n",
+            "undated.txt": "klima\n",
+        }
+        for filename, content in episodes.items():
+            with open(os.path.join(self.test_dir, filename), "w") as f:
+                f.write(content)
+        self.indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "index.pkl"))
+        self.indexer.build_index()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_aggregate_counts(self):
+        """Test bucketing by month and ISO week including empty periods"""
+        dated_counts = [(ordinal("2024-12-30"), 2), (ordinal("2025-01-02"), 1), (ordinal("2025-03-10"), 3)]
+        self.assertEqual(
+            [(p["period"], p["count"], p["episodes"]) for p in aggregate_counts(dated_counts, "month")],
+            [("2024-12", 2, 1), ("2025-01", 1, 1), ("2025-02", 0, 0), ("2025-03", 3, 1)],
+        )
+        weeks = aggregate_counts(dated_counts, "week")
+        self.assertEqual(weeks[0], {"period": "2025-W01", "count": 3, "episodes": 2})
+        self.assertEqual(weeks[-1]["period"], "2025-W11")
+        self.assertEqual(len(weeks), 11)
+
+        self.assertEqual(merge_timelines([weeks[:1], weeks[-1:]], "week"), weeks)
+        self.assertEqual(aggregate_counts([]), [])
+        with self.assertRaises(ValueError):
+            aggregate_counts(dated_counts, "year")
+
+    def test_term_timeline(self):
+        """Test that the timeline is computed from the word counts of the index"""
+        timeline = self.indexer.get_term_timeline("Klima")
+        self.assertEqual([p["count"] for p in timeline], [2, 1, 0, 3])
+
+        # the counts are stored in the index file
+        indexer = TextFileIndexer(self.test_dir, self.indexer.index_file)
+        indexer.load_index()
+        self.assertEqual(indexer.get_term_timeline("klima"), timeline)
+
+        timeline = indexer.get_term_timeline("klima", metadata_filter=MetadataFilter(date_from="2025-01-01"))
+        self.assertEqual([p["period"] for p in timeline], ["2025-01", "2025-02", "2025-03"])
+        self.assertEqual(indexer.get_term_timeline("unknown"), [])
+        with self.assertRaises(ValueError):
+            indexer.get_term_timeline("zwei worte")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from hakitool.search_engine import TextFileIndexer
+from hakitool.transcript_store import (
+    StoreFile, compress_transcript, compress_json_file, load_json_file, read_transcript_lines
+)
+
+
+class TestTranscriptStore(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary directory with a transcript and a json file"""
+        self.test_dir = tempfile.mkdtemp()
+        self.txt_path = os.path.join(self.test_dir, "2025-06-18_episode.txt")
+        self.lines = [f"Zeile {i}: Klimawandel und Süßigkeiten \n" if i % 7 == 0 else f"Zeile {i}\n" for i in range(1000)]
+        with open(self.txt_path, "w", encoding="utf-8") as f:
+            f.writelines(self.lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_random_access(self):
+        """Test that arbitrary line ranges are read correctly from the blocks"""
+        compress_transcript(self.txt_path, block_lines=64, remove_original=True)
+        self.assertFalse(os.path.exists(self.txt_path))
+
+        store_file = StoreFile(f"{self.txt_path}.hkz")
+        self.assertEqual(store_file.n_lines, 1000)
+        self.assertEqual(len(store_file.block_index), 16)
+        for start, end in [(0, None), (0, 1), (63, 65), (100, 300), (990, 2000), (1000, 1001)]:
+            self.assertEqual(read_transcript_lines(self.txt_path, start, end), self.lines[start:end])
+
+    def test_search_in_compressed_transcripts(self):
+        """Test that index and search work with compressed transcripts only"""
+        compress_transcript(self.txt_path, remove_original=True)
+        indexer = TextFileIndexer(self.test_dir, os.path.join(self.test_dir, "index.pkl"))
+        indexer.build_index()
+        self.assertEqual(indexer.files, [self.txt_path])
+
+        results = indexer.search_in_files("süßigkeiten")
+        self.assertEqual(len(results), 1)
+        filename, contexts, n_matches = results[0]
+        self.assertEqual(n_matches, 143)
+        self.assertEqual(len(contexts), 5)
+
+    def test_json(self):
+        """Test compact gzipped json files"""
+        json_path = os.path.join(self.test_dir, "episode.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"video_title": "Süß"}, f, indent=2)
+        compress_json_file(json_path, remove_original=True)
+        self.assertEqual(load_json_file(json_path), {"video_title": "Süß"})
+
+
+if __name__ == '__main__':
+    unittest.main()